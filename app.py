@@ -1,6 +1,7 @@
 import os
 import logging
 from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
@@ -8,6 +9,9 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 # Add WhiteNoise to serve static files in production
 from whitenoise import WhiteNoise
 
+import db_pool
+import db_routing
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
@@ -16,52 +20,95 @@ class Base(DeclarativeBase):
     pass
 
 # Initialize extensions
-db = SQLAlchemy(model_class=Base)
+# RoutingSession sends read-only requests' SELECTs to replicas; see db_routing
+db = SQLAlchemy(model_class=Base, session_options={"class_": db_routing.RoutingSession})
 login_manager = LoginManager()
 
-# --- Create the Flask App ---
-app = Flask(__name__)
+# --- Flask-Login Configuration ---
+login_manager.login_view = 'main.login'
+login_manager.login_message = 'Please log in to access this page.'
+login_manager.login_message_category = 'info'
 
-# --- Configuration ---
-app.secret_key = os.environ.get("SESSION_SECRET", "a-default-secret-key-that-you-should-change")
+@login_manager.user_loader
+def load_user(user_id):
+    # Cached read-only projection; see user_cache for TTL and invalidation
+    import user_cache
+    return user_cache.load_user(user_id)
 
-# Serve static files from the 'static/' directory using WhiteNoise
-app.wsgi_app = WhiteNoise(app.wsgi_app, root="static/")
-# Apply ProxyFix to handle headers from a proxy server like Render's
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+class PublicCacheSessionInterface(SecureCookieSessionInterface):
+    """Leaves Vary: Cookie off responses marked Cache-Control: public"""
 
-# --- Database configuration ---
-db_url = os.environ.get("DATABASE_URL")
-if db_url and db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
+    def save_session(self, app, session, response):
+        # Flask-Login reads the session after every request, which would make even
+        # /api/crypto-prices vary on Cookie and keep CDNs from sharing it
+        if response.cache_control.public and not session.modified:
+            session.accessed = False
+        super().save_session(app, session, response)
 
-app.config["SQLALCHEMY_DATABASE_URI"] = db_url or "sqlite:///crypto_platform.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 280,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# --- Initialize Extensions ---
-db.init_app(app)
-login_manager.init_app(app)
+def create_app():
+    """Build the Flask app; views and the price client load here or on first use, not at import"""
+    app = Flask(__name__)
 
-# --- Flask-Login Configuration ---
-login_manager.login_view = 'login'
-login_manager.login_message = 'Please log in to access this page.'
-login_manager.login_message_category = 'info'
+    # --- Configuration ---
+    app.secret_key = os.environ.get("SESSION_SECRET", "a-default-secret-key-that-you-should-change")
+    app.session_interface = PublicCacheSessionInterface()
 
-@login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    # Serve static files from the 'static/' directory using WhiteNoise
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root="static/")
+    # Apply ProxyFix to handle headers from a proxy server like Render's
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # --- Database configuration ---
+    db_url = os.environ.get("DATABASE_URL")
+    if db_url and db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_url or "sqlite:///crypto_platform.db"
+    # Pool sized from the gunicorn profile (workers x threads/greenlets); see db_pool
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_pool.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_BINDS"] = db_routing.replica_binds(db_pool.engine_options)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # --- Registration defaults ---
+    # Wallets provisioned for every new user, as "CURRENCY:opening_balance" pairs
+    app.config["DEFAULT_WALLETS"] = {
+        currency.strip(): balance.strip()
+        for currency, balance in (
+            pair.split(":") for pair in
+            os.environ.get("DEFAULT_WALLETS", "BTC:0,ETH:0,USDT:0,INR:10000,USD:0").split(",")
+        )
+    }
+
+    # --- Initialize Extensions ---
+    db.init_app(app)
+    login_manager.init_app(app)
 
-# --- Import Routes ---
-import routes
+    # --- Instrumentation ---
+    # Per-route latency, SQL and upstream timing, served on /metrics
+    import metrics
+    metrics.init_app(app)
+
+    # --- Blueprints ---
+    from routes import bp as main_bp
+    from commands import bp as commands_bp
+    app.register_blueprint(main_bp)
+    app.register_blueprint(commands_bp)
+
+    # Background tasks are started by whatever serves the app (main.py, gunicorn.conf.py),
+    # so CLI commands, shells and migrations never spawn a refresher
+    return app
+
+
+def start_background_tasks(app):
+    """Start this serving process's background threads; they don't survive a fork"""
+    # Keeps the price snapshot warm so request handlers never wait on CoinGecko.
+    if os.environ.get("PRICE_REFRESHER_ENABLED", "true").lower() == "true":
+        from crypto_api import crypto_api
+        crypto_api.start_refresher(app)
 
 # --- Database Creation ---
 # This block is now commented out. Use the separate create_db.py script.
-# with app.app_context():
+# with create_app().app_context():
 #     db.create_all()
-
@@ -0,0 +1,66 @@
+"""Requests/sec on the anonymous landing page, with and without caching (user-021).
+
+Three modes, all serving the same live snapshot in-process via the test client:
+  uncached   - every request renders index.html and its price fragment (before user-021)
+  fragments  - the price fragment is rendered once per snapshot, the page every time
+  full page  - the whole anonymous page is rendered once per snapshot (current)
+"""
+import time
+
+from flask import render_template
+from markupsafe import Markup
+
+from common import make_app, parser
+
+import fragment_cache
+
+PRICES = {
+    "bitcoin": {"usd": 60000.0, "inr": 4986000.0, "usd_24h_change": 1.5, "usd_market_cap": 1e12, "usd_24h_vol": 3e10},
+    "ethereum": {"usd": 3000.0, "inr": 249300.0, "usd_24h_change": -0.5, "usd_market_cap": 4e11, "usd_24h_vol": 1e10},
+    "tether": {"usd": 1.0, "inr": 83.1, "usd_24h_change": 0.0, "usd_market_cap": 1e11, "usd_24h_vol": 5e10},
+}
+
+
+def uncached_fragment(template, prices, **key):
+    return Markup(render_template(template, prices=prices, **key))
+
+
+def uncached_page(render, prices):
+    return render()
+
+
+def requests_per_second(client, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get("/")
+        assert response.status_code == 200, response.status_code
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--requests", type=int, default=2000)
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    from crypto_api import crypto_api
+
+    crypto_api.cache = PRICES
+    crypto_api.last_fetch_time = time.time()
+    client = app.test_client()
+    cached_fragment, cached_page = app.jinja_env.globals["price_fragment"], fragment_cache.cached_page
+
+    modes = (
+        ("uncached", uncached_fragment, uncached_page),
+        ("fragments", cached_fragment, uncached_page),
+        ("full page", cached_fragment, cached_page),
+    )
+    for name, fragment, page in modes:
+        app.jinja_env.globals["price_fragment"] = fragment
+        fragment_cache.cached_page = page
+        requests_per_second(client, 50)  # warm templates and caches
+        print(f"{name:>10}: {requests_per_second(client, args.requests):8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
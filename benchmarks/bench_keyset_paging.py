@@ -0,0 +1,99 @@
+"""Transaction history page latency by depth: keyset cursor vs OFFSET (user-011).
+
+Seeds --rows transactions (10M for the full run; the default is smaller so a
+quick run finishes in seconds). One account holds a tenth of them, so it can
+be paged deep. Then it times fetching one page at increasing depths, both
+with page_transactions' (created_at, id) cursor and with LIMIT/OFFSET.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+from common import make_app, parser, timed
+
+from app import db
+import transaction_history
+from transaction_history import encode_cursor, page_transactions, user_transactions
+
+TYPES = ("buy", "sell", "convert", "send", "receive")
+BATCH = 50000
+DEPTHS = (0, 1000, 10000, 100000, 500000)
+
+
+def seed(rows, users=1000):
+    """Bulk insert users and rows; user 1 is the heavy account"""
+    conn = db.session.connection()
+    conn.execute(text(
+        "INSERT INTO user (id, username, email, password_hash, first_name, last_name) "
+        "VALUES (:id, :name, :name || '@example.com', 'x', 'Bench', 'User')"
+    ), [{"id": i, "name": f"bench{i}"} for i in range(1, users + 1)])
+
+    heavy = rows // 10
+    start = datetime(2020, 1, 1)
+    insert = text(
+        'INSERT INTO "transaction" (user_id, transaction_type, from_currency, to_currency, '
+        "amount, rate, fee, status, created_at) "
+        "VALUES (:user_id, :type, 'INR', 'BTC', 100000000, 10000000000, 0, 'completed', :created_at)"
+    )
+    rng = random.Random(0)
+    for offset in range(0, rows, BATCH):
+        conn.execute(insert, [{
+            "user_id": 1 if i < heavy else rng.randint(2, users),
+            "type": TYPES[i % len(TYPES)],
+            # Whole seconds, so many rows share a created_at and the id tiebreak matters
+            "created_at": start + timedelta(seconds=i // 3),
+        } for i in range(offset, min(offset + BATCH, rows))])
+    db.session.commit()
+    return heavy
+
+
+def explain(fetch):
+    """The database's plan for the last statement fetch() runs"""
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, many: statements.append((statement, params))
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        fetch()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    statement, params = statements[-1]
+    prefix = "EXPLAIN QUERY PLAN " if db.engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.session.connection().exec_driver_sql(prefix + statement, params)
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def cursor_at(depth, types):
+    row = user_transactions(1, types).offset(depth - 1).limit(1).one()
+    return encode_cursor(row)
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--rows", type=int, default=1000000, help="transactions to seed (request asked for 10000000)")
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        started = time.perf_counter()
+        heavy = seed(args.rows)
+        print(f"seeded {args.rows:,} rows ({heavy:,} on the paged account) in {time.perf_counter() - started:.0f}s")
+
+        size = transaction_history.DEFAULT_PAGE_SIZE
+        print("keyset plan:", explain(lambda: page_transactions(1, size, cursor_at(1000, None))))
+
+        for label, types in (("all types", None), ("send,receive", ["send", "receive"])):
+            last = user_transactions(1, types).count() - size
+            print(f"\n{label}\n{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+            for depth in [d for d in DEPTHS if d < last] + [last]:
+                cursor = cursor_at(depth, types) if depth else None
+                keyset = timed(page_transactions, 1, size, cursor, types)
+                offset = timed(lambda: user_transactions(1, types).offset(depth).limit(size).all())
+                print(f"{depth:>10,} {keyset * 1000:>10.2f} {offset * 1000:>10.2f}")
+                db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
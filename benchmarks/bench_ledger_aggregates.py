@@ -0,0 +1,115 @@
+"""Ledger aggregates over integer minor units vs the old Float columns (user-010).
+
+Seeds --users users with one wallet per currency, and --transactions trades
+spread over --days days. Then it times two queries: total balance per
+currency and daily volume per currency. Each runs over the BIGINT columns and
+over a REAL copy of them, which is how the Float schema stored amounts. The
+integer sums are checked against Python's exact sum; the float sums show how
+far they drift from it.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from common import make_app, parser, timed
+
+from app import db
+from money import UNIT, from_units
+
+CURRENCIES = ("BTC", "ETH", "USDT", "INR", "USD")
+BATCH = 50000
+
+BALANCES = {
+    "integer": "SELECT currency, SUM(balance) FROM wallet GROUP BY currency",
+    "float": "SELECT currency, SUM(balance_float) FROM wallet GROUP BY currency",
+}
+DAILY_VOLUME = {
+    "integer": 'SELECT date(created_at), from_currency, SUM(amount) FROM "transaction" '
+               "GROUP BY date(created_at), from_currency",
+    "float": 'SELECT date(created_at), from_currency, SUM(amount_float) FROM "transaction" '
+             "GROUP BY date(created_at), from_currency",
+}
+
+
+def seed(users, transactions, days):
+    rng = random.Random(7)
+    conn = db.session.connection()
+    for start in range(1, users + 1, BATCH):
+        ids = range(start, min(start + BATCH, users + 1))
+        conn.execute(text(
+            "INSERT INTO user (id, username, email, password_hash, first_name, last_name) "
+            "VALUES (:id, 'u' || :id, 'u' || :id || '@example.com', 'x', 'Bench', 'User')"
+        ), [{"id": i} for i in ids])
+        conn.execute(text("INSERT INTO wallet (user_id, currency, balance) VALUES (:user_id, :currency, :balance)"), [
+            {"user_id": i, "currency": c, "balance": rng.randrange(10 * UNIT)}
+            for i in ids for c in CURRENCIES
+        ])
+
+    now = datetime.utcnow()
+    for start in range(0, transactions, BATCH):
+        conn.execute(text(
+            'INSERT INTO "transaction" (user_id, transaction_type, from_currency, to_currency, amount, fee, '
+            "status, created_at) VALUES (:user_id, 'convert', :currency, 'INR', :amount, 0, 'completed', :created_at)"
+        ), [
+            {"user_id": rng.randint(1, users), "currency": rng.choice(CURRENCIES),
+             "amount": rng.randrange(UNIT), "created_at": now - timedelta(seconds=rng.randrange(days * 86400))}
+            for _ in range(start, min(start + BATCH, transactions))
+        ])
+
+    # The Float schema's representation of the same amounts
+    conn.execute(text("ALTER TABLE wallet ADD COLUMN balance_float FLOAT"))
+    conn.execute(text(f"UPDATE wallet SET balance_float = balance / {float(UNIT)}"))
+    conn.execute(text('ALTER TABLE "transaction" ADD COLUMN amount_float FLOAT'))
+    conn.execute(text(f'UPDATE "transaction" SET amount_float = amount / {float(UNIT)}'))
+    db.session.commit()
+
+
+def run(sql):
+    return db.session.execute(text(sql)).fetchall()
+
+
+def exact_totals(sql):
+    """{group: Decimal total}, summed in Python from the integer units of each row"""
+    totals = {}
+    for *group, units in run(sql):
+        totals[tuple(group)] = totals.get(tuple(group), 0) + units
+    return {group: from_units(units) for group, units in totals.items()}
+
+
+def compare(name, queries, exact):
+    """Time both queries and report each one's largest error against the exact totals"""
+    for kind, sql in queries.items():
+        seconds = timed(run, sql)
+        totals = {tuple(group): total for *group, total in run(sql)}
+        if kind == "integer":
+            assert all(isinstance(total, int) for total in totals.values()), "SUM did not stay integer"
+            errors = [abs(from_units(totals[group]) - total) for group, total in exact.items()]
+        else:
+            errors = [abs(Decimal(repr(totals[group])) - total) for group, total in exact.items()]
+        print(f"{name:<13} {kind:<8} {seconds * 1000:8.1f} ms  {len(totals):>4} groups  max error {float(max(errors)):.2E}")
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--users", type=int, default=200000)
+    p.add_argument("--transactions", type=int, default=1000000)
+    p.add_argument("--days", type=int, default=30)
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users, args.transactions, args.days)
+        print(f"seeded {args.users * len(CURRENCIES):,} wallets / {args.transactions:,} transactions "
+              f"in {time.perf_counter() - started:.0f}s")
+
+        compare("balances", BALANCES, exact_totals("SELECT currency, balance FROM wallet"))
+        compare("daily volume", DAILY_VOLUME,
+                exact_totals('SELECT date(created_at), from_currency, amount FROM "transaction"'))
+
+
+if __name__ == "__main__":
+    main()
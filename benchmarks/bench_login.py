@@ -0,0 +1,137 @@
+"""Login throughput, and the latency of other pages meanwhile (user-014).
+
+Runs gunicorn with the chosen profile once per --hash-workers value
+(PASSWORD_HASH_WORKERS; 0 hashes inline on the request thread). --clients
+threads POST /login with the right password as fast as they can. Each POST
+starts from a logged-out session that holds a CSRF token. Meanwhile one
+bystander fetches / in a loop. An idle run with no logins gives the
+baseline for /.
+
+Needs gunicorn installed. Run from the repo root, e.g.
+`python benchmarks/bench_login.py --clients 16`.
+"""
+import os
+import re
+import signal
+import threading
+import time
+
+import requests
+
+from common import ROOT, make_app, parser
+from load_test_workers import percentile, start_gunicorn
+
+os.environ.setdefault("SESSION_SECRET", "load-test-secret")
+
+PASSWORD = "correct horse battery staple"
+
+
+def seed_users(app, count):
+    """`count` users sharing one password hash made with the configured method"""
+    from sqlalchemy import insert
+
+    from app import db
+    from models import User
+    from passwords import hash_password
+
+    password_hash = hash_password(PASSWORD)
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"username": f"login{i}", "email": f"login{i}@example.com", "password_hash": password_hash,
+             "first_name": "Load", "last_name": "Test"}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def logged_out_session(url):
+    """A session cookie holding a CSRF token, and the token for the login form"""
+    session = requests.Session()
+    page = session.get(f"{url}/login", timeout=30).text
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    return session.cookies["session"], token
+
+
+def run_load(url, clients, users, duration):
+    deadline = time.time() + duration
+    logins, errors, page_latencies = [], [0], []
+    lock = threading.Lock()
+
+    def client(n):
+        cookie, token = logged_out_session(url)
+        session = requests.Session()
+        i = n
+        while time.time() < deadline:
+            session.cookies.clear()
+            session.cookies.set("session", cookie)
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{url}/login", allow_redirects=False, timeout=60, data={
+                    "csrf_token": token, "username": f"login{i % users}", "password": PASSWORD,
+                })
+                ok = response.status_code == 302
+            except requests.RequestException:
+                ok = False
+            if time.time() > deadline:
+                break  # finished after the window; counting it would inflate logins/s
+            with lock:
+                if ok:
+                    logins.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+            i += clients
+
+    def bystander():
+        session = requests.Session()
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                session.get(f"{url}/", timeout=60)
+                page_latencies.append(time.perf_counter() - started)
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)] + [threading.Thread(target=bystander)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return logins, errors[0], page_latencies
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--profile", default="gthread")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--hash-workers", default="0,2", help="PASSWORD_HASH_WORKERS values to compare")
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--duration", type=float, default=10)
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    seed_users(app, args.users)
+
+    from passwords import PASSWORD_HASH_METHOD
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    print(f"{args.clients} clients, {args.profile} x {args.workers} workers, {PASSWORD_HASH_METHOD}, "
+          f"{args.duration:.0f}s per run")
+    print(f"{'hash workers':>12} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} "
+          f"{'/ p50 ms':>9} {'/ p95 ms':>9}")
+    runs = [("idle", "0", 0)] + [(workers, workers, args.clients) for workers in args.hash_workers.split(",")]
+    for label, hash_workers, clients in runs:
+        proc, url = start_gunicorn(args.profile, args.workers, None, dict(env, PASSWORD_HASH_WORKERS=hash_workers))
+        try:
+            logins, errors, pages = run_load(url, clients, args.users, args.duration)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        print(f"{label:>12} {len(logins) / args.duration:>9.1f} {percentile(logins, 50) * 1000:>8.0f} "
+              f"{percentile(logins, 95) * 1000:>8.0f} {errors:>7} {percentile(pages, 50) * 1000:>9.0f} "
+              f"{percentile(pages, 95) * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
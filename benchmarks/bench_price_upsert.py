@@ -0,0 +1,58 @@
+"""Refresh cost of _update_price_database as the coin universe grows (user-003).
+
+Compares the single INSERT ... ON CONFLICT upsert against the original
+SELECT-then-update loop, one round trip per coin.
+"""
+from common import make_app, parser, timed
+
+from app import db
+from crypto_api import CryptoAPI
+from models import CryptoPrice
+
+
+def quotes(n, tick):
+    return {f"coin-{i}": {"usd": 100.0 + i + tick, "inr": 8300.0 + i, "usd_24h_change": 0.5,
+                          "usd_market_cap": 1e9, "usd_24h_vol": 1e7} for i in range(n)}
+
+
+def per_row_update(symbols, data):
+    """The pre-user-003 implementation"""
+    for coin_id, coin_data in data.items():
+        record = CryptoPrice.query.filter_by(symbol=symbols[coin_id]).first()
+        if not record:
+            record = CryptoPrice(symbol=symbols[coin_id])
+            db.session.add(record)
+        record.current_price_usd = coin_data["usd"]
+        record.current_price_inr = coin_data["inr"]
+        record.price_change_24h = coin_data["usd_24h_change"]
+        record.market_cap = coin_data["usd_market_cap"]
+        record.volume_24h = coin_data["usd_24h_vol"]
+    db.session.commit()
+
+
+def main():
+    args = parser(__doc__).parse_args()
+    app = make_app(args.database_url)
+    api = CryptoAPI()
+
+    print(f"{'coins':>6} {'per-row ms':>11} {'upsert ms':>10} {'speedup':>8}")
+    with app.app_context():
+        for n in (3, 10, 50, 100, 250, 500):
+            api.SYMBOLS = {f"coin-{i}": f"C{i}" for i in range(n)}
+            data = quotes(n, 0)
+
+            CryptoPrice.query.delete()
+            per_row_update(api.SYMBOLS, data)  # warm: rows exist, as on every refresh after the first
+            legacy = timed(per_row_update, api.SYMBOLS, data)
+            db.session.remove()
+
+            CryptoPrice.query.delete()
+            api._update_price_database(data)
+            upsert = timed(api._update_price_database, data)
+            db.session.remove()
+
+            print(f"{n:>6} {legacy * 1000:>11.2f} {upsert * 1000:>10.2f} {legacy / upsert:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
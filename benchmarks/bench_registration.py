@@ -0,0 +1,101 @@
+"""Registrations per second (user-015).
+
+db path:  the database work of one registration, password hash precomputed.
+          legacy = two duplicate SELECTs, commit, five Wallet INSERTs, commit;
+          current = one SELECT, flush, one bulk wallet INSERT, one commit.
+end to end: POST /register through the app, with the configured hash method.
+
+Pass --database-url postgresql://... to run the same against Postgres.
+"""
+import itertools
+import os
+import time
+
+from common import make_app, parser
+
+WALLETS = {"BTC": 0, "ETH": 0, "USDT": 0, "INR": 10000, "USD": 0}
+_names = itertools.count()
+
+
+def new_user(User, n):
+    return User(username=f"reg{n}", email=f"reg{n}@example.com", first_name="Bench",
+                last_name="User", phone="9999999999", password_hash="x")
+
+
+def legacy(db, User, Wallet):
+    n = next(_names)
+    User.query.filter_by(username=f"reg{n}").first()
+    User.query.filter_by(email=f"reg{n}@example.com").first()
+    user = new_user(User, n)
+    db.session.add(user)
+    db.session.commit()
+    for currency, balance in WALLETS.items():
+        db.session.add(Wallet(user_id=user.id, currency=currency, balance=balance))
+    db.session.commit()
+
+
+def current(db, User, Wallet):
+    from sqlalchemy import insert
+
+    n = next(_names)
+    User.query.with_entities(User.username, User.email).filter(
+        (User.username == f"reg{n}") | (User.email == f"reg{n}@example.com")
+    ).all()
+    user = new_user(User, n)
+    db.session.add(user)
+    db.session.flush()
+    db.session.execute(insert(Wallet), [
+        {"user_id": user.id, "currency": currency, "balance": balance} for currency, balance in WALLETS.items()
+    ])
+    db.session.commit()
+
+
+def rate(fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--count", type=int, default=500, help="registrations per db-path run")
+    p.add_argument("--http-count", type=int, default=50, help="registrations per end-to-end run")
+    p.add_argument("--hash-method", help="override PASSWORD_HASH_METHOD, e.g. pbkdf2:sha256:1 to take hashing out")
+    args = p.parse_args()
+
+    if args.hash_method:
+        os.environ["PASSWORD_HASH_METHOD"] = args.hash_method
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+    app = make_app(args.database_url)
+    app.config.update(WTF_CSRF_ENABLED=False, DEFAULT_WALLETS=WALLETS)
+
+    from app import db
+    from models import User, Wallet
+    import passwords
+
+    with app.app_context():
+        for name, flow in (("legacy", legacy), ("current", current)):
+            flow(db, User, Wallet)  # warm up
+            print(f"db path  {name:>8}: {rate(lambda: flow(db, User, Wallet), args.count):8.0f} registrations/s")
+            db.session.remove()
+
+    client = app.test_client()
+
+    def register():
+        n = next(_names)
+        response = client.post("/register", data={
+            "username": f"reg{n}", "email": f"reg{n}@example.com", "first_name": "Bench",
+            "last_name": "User", "phone": "9999999999", "password": "correct horse",
+            "confirm_password": "correct horse",
+        })
+        assert response.status_code == 302, response.status_code
+
+    register()
+    print(f"end to end ({passwords.PASSWORD_HASH_METHOD}): "
+          f"{rate(register, args.http_count):8.1f} registrations/s")
+
+
+if __name__ == "__main__":
+    main()
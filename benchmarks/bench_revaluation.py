@@ -0,0 +1,80 @@
+"""Revaluing every portfolio: streamed numpy pass vs the per-user ORM loop (user-007).
+
+Seeds --users users with one wallet per currency (200k users x 5 = 1M wallets
+by default). Then it times revalue_all_portfolios over all of them, and the
+old approach, User.get_portfolio_value() per user, over --orm-users users.
+The ORM figure is extrapolated to the full user count. A sample of users is
+checked to get the same INR total from both.
+"""
+import math
+import time
+
+from sqlalchemy import text
+
+from common import make_app, parser
+
+from app import db
+from models import PortfolioSnapshot, User
+from money import UNIT
+from revaluation import revalue_all_portfolios
+
+PRICES = {
+    "bitcoin": {"usd": 60000.0, "inr": 4986000.0},
+    "ethereum": {"usd": 3000.0, "inr": 249300.0},
+    "tether": {"usd": 1.0, "inr": 83.1},
+}
+CURRENCIES = ("BTC", "ETH", "USDT", "INR", "USD")
+BATCH = 50000
+
+
+def seed(users):
+    conn = db.session.connection()
+    for start in range(1, users + 1, BATCH):
+        ids = range(start, min(start + BATCH, users + 1))
+        conn.execute(text(
+            "INSERT INTO user (id, username, email, password_hash, first_name, last_name) "
+            "VALUES (:id, 'u' || :id, 'u' || :id || '@example.com', 'x', 'Bench', 'User')"
+        ), [{"id": i} for i in ids])
+        conn.execute(text("INSERT INTO wallet (user_id, currency, balance) VALUES (:user_id, :currency, :balance)"), [
+            {"user_id": i, "currency": c, "balance": (i % 97 + n) * UNIT // 10}
+            for i in ids for n, c in enumerate(CURRENCIES)
+        ])
+    db.session.commit()
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--users", type=int, default=200000)
+    p.add_argument("--orm-users", type=int, default=2000, help="users valued with the ORM loop")
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.users)
+        print(f"seeded {args.users:,} users / {args.users * len(CURRENCIES):,} wallets "
+              f"in {time.perf_counter() - started:.0f}s")
+
+        started = time.perf_counter()
+        count = revalue_all_portfolios(PRICES)
+        bulk = time.perf_counter() - started
+        print(f"revalue_all_portfolios: {count:,} portfolios in {bulk:.2f}s")
+
+        sample = User.query.order_by(User.id).limit(args.orm_users).all()
+        started = time.perf_counter()
+        orm_totals = {user.id: user.get_portfolio_value(PRICES) for user in sample}
+        orm = time.perf_counter() - started
+        per_user = orm / len(sample)
+        print(f"ORM loop: {len(sample):,} users in {orm:.2f}s; "
+              f"{args.users:,} users would take ~{per_user * args.users:.0f}s "
+              f"({per_user * args.users / bulk:.0f}x slower)")
+
+        snapshots = dict(db.session.query(PortfolioSnapshot.user_id, PortfolioSnapshot.value_inr)
+                         .filter(PortfolioSnapshot.user_id.in_(list(orm_totals))))
+        mismatched = [u for u, total in orm_totals.items() if not math.isclose(total, snapshots[u], rel_tol=1e-9)]
+        print(f"checked {len(orm_totals):,} users against the ORM totals: {len(mismatched)} mismatched")
+        assert not mismatched, mismatched[:5]
+
+
+if __name__ == "__main__":
+    main()
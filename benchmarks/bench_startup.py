@@ -0,0 +1,92 @@
+"""Startup cost (user-024): import time, app construction and time to first response.
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+  import app     - `import app` alone; views, the price client and requests stay unloaded
+  create_app()   - importing and building the app, registering blueprints
+  CLI command    - create_app() as `flask <command>` does; must not start the refresher
+  gunicorn       - spawn to first 200 on /, with GUNICORN_PRELOAD off and on
+"""
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from common import ROOT, make_app, parser
+from load_test_workers import free_port
+
+IMPORT_APP = """
+import sys, time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started, *sorted(m for m in ("routes", "crypto_api", "requests") if m in sys.modules))
+"""
+
+CREATE_APP = """
+import threading, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - started, *sorted(t.name for t in threading.enumerate() if t.name == "price-refresher"))
+"""
+
+
+def run_python(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    seconds, *extra = out.stdout.split()
+    return float(seconds), extra
+
+
+def best(code, env, repeat):
+    runs = [run_python(code, env) for _ in range(repeat)]
+    return min(seconds for seconds, _ in runs), runs[0][1]
+
+
+def first_response(env, preload):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+         "--access-logfile", "/dev/null", "app:create_app()"],
+        cwd=ROOT, env=dict(env, GUNICORN_PRELOAD=str(preload).lower()),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/", timeout=5).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                time.sleep(0.02)
+        raise RuntimeError("gunicorn did not answer within 60s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+
+    make_app(args.database_url)  # creates the tables and sets DATABASE_URL for the children
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+
+    seconds, loaded = best(IMPORT_APP, env, args.repeat)
+    print(f"{'import app':>24}: {seconds * 1000:7.0f} ms  heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+    seconds, _ = best(CREATE_APP, env, args.repeat)
+    print(f"{'import + create_app()':>24}: {seconds * 1000:7.0f} ms")
+
+    # As a CLI command would, but with the refresher enabled: it must still not start
+    _, threads = run_python(CREATE_APP, dict(env, PRICE_REFRESHER_ENABLED="true"))
+    print(f"{'CLI refresher threads':>24}: {len(threads)}")
+
+    for preload in (False, True):
+        seconds = min(first_response(env, preload) for _ in range(args.repeat))
+        print(f"{f'gunicorn preload={preload}':>24}: {seconds * 1000:7.0f} ms to first response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Shared setup for the standalone benchmark scripts in this directory.
+
+Run a script from the repository root, e.g. `python benchmarks/bench_price_upsert.py`.
+Every script uses a throwaway SQLite file unless --database-url points elsewhere.
+"""
+import argparse
+import atexit
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Benchmarks never want the background refresher or a real CoinGecko call
+os.environ.setdefault("PRICE_REFRESHER_ENABLED", "false")
+os.environ.setdefault("COINGECKO_BASE_URL", "http://127.0.0.1:9")
+
+
+def parser(description):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--database-url", help="database to benchmark against (default: temporary SQLite file)")
+    return p
+
+
+def make_app(database_url=None):
+    """A fresh app bound to database_url with every table created"""
+    if not database_url:
+        fd, path = tempfile.mkstemp(suffix=".db", prefix="bench-")
+        os.close(fd)
+        atexit.register(_remove_sqlite, path)  # seeded files can run to gigabytes
+        database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = database_url
+
+    from app import create_app, db
+    import models  # noqa: F401 - registers the tables
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def _remove_sqlite(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def timed(fn, *args, repeat=5, **kwargs):
+    """Best wall-clock seconds of `repeat` calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best
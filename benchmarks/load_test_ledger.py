@@ -0,0 +1,97 @@
+"""Concurrent debits against one wallet (user-009).
+
+Many threads send 1-unit payments out of a single sender wallet, and every
+idempotency key is submitted twice, as a double-clicked form would. The
+guarded UPDATE in ledger._debit must stop the wallet going negative and the
+unique key must stop a resubmit paying twice, so at the end:
+
+    sender balance    == start - completed payments
+    recipient balance == completed payments
+    completed payments == min(start balance, distinct keys)
+"""
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from common import make_app, parser
+
+from app import db
+from ledger import InsufficientFunds, execute_payment
+from models import Transaction, User, Wallet
+
+CURRENCY = "INR"
+
+
+def make_user(name, balance):
+    user = User(username=name, email=f"{name}@example.com", password_hash="x",
+                first_name="Load", last_name="Test")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Wallet(user_id=user.id, currency=CURRENCY, balance=balance))
+    db.session.commit()
+    return user.id
+
+
+def balance(user_id):
+    return Wallet.query.filter_by(user_id=user_id, currency=CURRENCY).one().balance
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--keys", type=int, default=400, help="distinct payments; each is submitted twice")
+    p.add_argument("--balance", type=int, default=250, help="sender's starting balance, in whole units")
+    args = p.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        sender = make_user("sender", args.balance)
+        recipient = make_user("recipient", 0)
+        db.session.remove()
+
+    # Both submissions of a key land on different threads
+    jobs = [f"pay-{i}" for i in range(args.keys)] * 2
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+
+    def worker(keys):
+        with app.app_context():
+            for key in keys:
+                try:
+                    execute_payment(sender, recipient, "recipient@example.com", CURRENCY,
+                                    Decimal(1), Decimal(0), idempotency_key=key)
+                    outcome = "completed"  # includes replays of an already-paid key
+                except InsufficientFunds:
+                    outcome = "insufficient"
+                except Exception as e:
+                    outcome = type(e).__name__
+                with outcomes_lock:
+                    outcomes[outcome] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(jobs[i::args.threads],)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        paid = Transaction.query.filter_by(user_id=sender, transaction_type="send").count()
+        sender_balance, recipient_balance = balance(sender), balance(recipient)
+
+    print(f"{len(jobs)} submissions on {args.threads} threads in {elapsed:.2f}s "
+          f"({len(jobs) / elapsed:.0f} tx/s), outcomes: {dict(outcomes)}")
+    print(f"payments {paid}, sender {sender_balance}, recipient {recipient_balance}")
+
+    assert paid == min(args.balance, args.keys), "a payment was lost or applied twice"
+    assert sender_balance == args.balance - paid, "sender balance doesn't match the payments made"
+    assert recipient_balance == paid, "recipient balance doesn't match the payments made"
+    assert sender_balance >= 0
+    print("OK: no double-spend, no duplicate payment")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Open SSE price streams against one gunicorn worker (user-016).
+
+Starts a CoinGecko stub whose prices move on every call and one gunicorn
+worker with the chosen profile (gevent by default). The worker refreshes
+prices every --tick seconds. For each count in --clients it opens that many
+/api/prices/stream connections from a single selector loop and collects
+ticks for --duration seconds. It reports:
+
+  RSS per client  growth of the worker's resident memory over its idle
+                  size, divided by the streams it accepted
+  fan-out         per tick, first to last client receiving that delta frame,
+                  measured on this side, so it includes this loop's own delay
+
+PRICE_STREAM_MAX_CLIENTS and GUNICORN_WORKER_CONNECTIONS are raised to fit
+the largest count. Pass --profile gthread to see its per-worker cap answer
+503 instead: threads // 2 streams.
+
+Needs gunicorn and gevent installed. Run from the repo root, e.g.
+`python benchmarks/load_test_price_stream.py --clients 100,1000,2000`.
+"""
+import itertools
+import json
+import os
+import re
+import selectors
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from common import ROOT, make_app, parser
+from load_test_workers import free_port
+
+FRAME_ID = re.compile(rb"id: (\d+)\nevent: delta\n")
+
+# The repo's config, with the refresher started on a short interval
+CONFIG = """
+exec(open({path!r}).read())
+
+
+def post_worker_init(worker):
+    from crypto_api import crypto_api
+    crypto_api.start_refresher(worker.wsgi, interval={tick})
+"""
+
+
+def start_ticking_stub():
+    """A stand-in for CoinGecko whose prices change on every call, so every refresh is a tick"""
+    calls = itertools.count()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            n = next(calls)
+            body = json.dumps({
+                coin: {"usd": price + n, "inr": (price + n) * 83.0, "usd_24h_change": 0.0,
+                       "usd_market_cap": 1.0, "usd_24h_vol": 1.0}
+                for coin, price in (("bitcoin", 60000.0), ("ethereum", 3000.0), ("tether", 1.0))
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def start_gunicorn(profile, tick, env):
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as config:
+        config.write(CONFIG.format(path=os.path.join(ROOT, "gunicorn.conf.py"), tick=tick))
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", config.name, "-b", f"127.0.0.1:{port}",
+         "--access-logfile", "/dev/null", "--backlog", "4096", "app:create_app()"],
+        cwd=ROOT, env=dict(env, GUNICORN_PROFILE=profile, WEB_CONCURRENCY="1"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/api/crypto-prices", timeout=1)
+            os.remove(config.name)
+            return proc, port
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({profile}) did not start")
+
+
+def worker_rss(master_pid):
+    """Resident set size in bytes of the master's (single) worker"""
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if ppid != master_pid:
+                continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            continue
+    raise RuntimeError("gunicorn worker not found")
+
+
+def run_streams(port, clients, duration):
+    """Open `clients` streams; returns (accepted, answered 503, {seq: [arrival times]})"""
+    selector = selectors.DefaultSelector()
+    request = f"GET /api/prices/stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nAccept: text/event-stream\r\n\r\n"
+    buffers, status = {}, {}
+    for _ in range(clients):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(request.encode())
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        buffers[sock] = b""
+
+    arrivals = {}
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            sock = key.fileobj
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                continue
+            now = time.perf_counter()
+            if not data:
+                selector.unregister(sock)
+                continue
+            if sock not in status:
+                status[sock] = data.split(b" ", 2)[1]
+            # Frames can straddle reads; keep the unparsed tail
+            buffer = buffers[sock] + data
+            for match in FRAME_ID.finditer(buffer):
+                arrivals.setdefault(int(match.group(1)), []).append(now)
+            buffers[sock] = buffer[buffer.rfind(b"\n\n") + 2:] if b"\n\n" in buffer else buffer
+
+    accepted = sum(1 for code in status.values() if code == b"200")
+    rejected = sum(1 for code in status.values() if code == b"503")
+    for sock in buffers:
+        sock.close()
+    selector.close()
+    return accepted, rejected, arrivals
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--profile", default="gevent")
+    p.add_argument("--clients", default="100,500,1000", help="comma-separated stream counts")
+    p.add_argument("--duration", type=float, default=15, help="seconds of ticks collected per count")
+    p.add_argument("--tick", type=float, default=1, help="price refresh interval, seconds")
+    args = p.parse_args()
+
+    counts = [int(c) for c in args.clients.split(",")]
+    os.environ["COINGECKO_BASE_URL"] = start_ticking_stub()
+    make_app(args.database_url)
+
+    env = dict(os.environ, PRICE_REFRESHER_ENABLED="false",
+               PRICE_STREAM_MAX_CLIENTS=str(max(counts)),
+               GUNICORN_WORKER_CONNECTIONS=str(max(counts) + 100),
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    if args.profile != "gevent":
+        env.pop("PRICE_STREAM_MAX_CLIENTS")  # keep the profile's own cap
+
+    print(f"{args.profile}, 1 worker, tick every {args.tick:g}s, {args.duration:.0f}s per count")
+    print(f"{'clients':>8} {'accepted':>9} {'503':>6} {'RSS MiB':>8} {'KiB/client':>11} "
+          f"{'ticks':>6} {'fan-out p50 ms':>15} {'max ms':>8}")
+    for count in counts:
+        proc, port = start_gunicorn(args.profile, args.tick, env)
+        try:
+            idle = worker_rss(proc.pid)
+            accepted, rejected, arrivals = run_streams(port, count, args.duration)
+            rss = worker_rss(proc.pid)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+
+        # Only ticks every accepted stream saw; the first and last may be cut by the window
+        spreads = [max(times) - min(times) for times in arrivals.values() if accepted and len(times) == accepted]
+        per_client = (rss - idle) / accepted / 1024 if accepted else float("nan")
+        p50 = statistics.median(spreads) * 1000 if spreads else float("nan")
+        worst = max(spreads) * 1000 if spreads else float("nan")
+        print(f"{count:>8} {accepted:>9} {rejected:>6} {rss / 2 ** 20:>8.1f} {per_client:>11.1f} "
+              f"{len(spreads):>6} {p50:>15.1f} {worst:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
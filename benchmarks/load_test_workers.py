@@ -0,0 +1,195 @@
+"""Concurrent-user capacity of the sync, gthread and gevent profiles (user-022).
+
+Starts a local stub of the CoinGecko API that sleeps --latency seconds per
+call, then runs gunicorn with each GUNICORN_PROFILE in turn against it.
+--users logged-in clients request chart data as fast as they can. The
+history cache is disabled, so every request waits on the stub. Clients
+rotate over every (coin, days bucket) so get_historical_data's per-chart
+lock doesn't serialize them. Meanwhile one bystander fetches / in a loop,
+showing whether page traffic starves while upstream calls are in flight.
+
+Upper bounds besides the worker class: one upstream call per chart key at a
+time, and UpstreamClient's pool of 10 connections per worker.
+
+Needs gunicorn (and gevent for that profile) installed. Run from the repo
+root, e.g. `python benchmarks/load_test_workers.py --users 50`.
+"""
+import itertools
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from common import ROOT, make_app, parser
+
+from crypto_api import HISTORY_DAY_BUCKETS
+from coins import SYMBOLS
+
+os.environ.setdefault("SESSION_SECRET", "load-test-secret")
+
+CHARTS = [(coin_id, days) for coin_id in SYMBOLS for days in HISTORY_DAY_BUCKETS]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(latency):
+    """A threaded stand-in for CoinGecko that answers every call after `latency` seconds"""
+    now_ms = int(time.time() * 1000)
+    chart = json.dumps({
+        "prices": [[now_ms - i * 3600000, 60000.0 + i] for i in range(168)],
+        "market_caps": [], "total_volumes": [],
+    }).encode()
+    prices = json.dumps({
+        coin: {"usd": 1.0, "inr": 83.0, "usd_24h_change": 0.0, "usd_market_cap": 1.0, "usd_24h_vol": 1.0}
+        for coin in ("bitcoin", "ethereum", "tether")
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = chart if "market_chart" in self.path else prices
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 1024  # the default of 5 refuses connections under load
+
+    server = Server(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def session_cookie(app):
+    """A signed Flask session for a freshly created user"""
+    from app import db
+    from models import User
+
+    with app.app_context():
+        user = User(username="loadtest", email="loadtest@example.com", password_hash="x",
+                    first_name="Load", last_name="Test")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    return app.session_interface.get_signing_serializer(app).dumps({"_user_id": str(user_id), "_fresh": True})
+
+
+def start_gunicorn(profile, workers, base, env):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+         "--access-logfile", "/dev/null", "app:create_app()"],
+        cwd=ROOT, env=dict(env, GUNICORN_PROFILE=profile, WEB_CONCURRENCY=str(workers)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/api/crypto-prices", timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({profile}) did not start")
+
+
+def run_load(url, cookie, users, duration):
+    deadline = time.time() + duration
+    latencies, errors, page_latencies = [], [0], []
+    lock = threading.Lock()
+
+    def user(offset):
+        session = requests.Session()
+        session.cookies.set("session", cookie)
+        charts = itertools.cycle(CHARTS[offset % len(CHARTS):] + CHARTS[:offset % len(CHARTS)])
+        while time.time() < deadline:
+            coin_id, days = next(charts)
+            started = time.perf_counter()
+            try:
+                response = session.get(f"{url}/api/historical-data/{coin_id}?days={days}", timeout=30)
+                # An upstream error is served as an empty 200 chart; count it as a failure
+                ok = response.status_code == 200 and bool(response.json().get("prices"))
+            except (requests.RequestException, ValueError):
+                ok = False
+            if time.time() > deadline:
+                break  # finished after the window; counting it would inflate req/s
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+
+    def bystander():
+        session = requests.Session()
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                session.get(f"{url}/", timeout=30)
+                page_latencies.append(time.perf_counter() - started)
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)] + [threading.Thread(target=bystander)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], page_latencies
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else float("nan")
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--profiles", default="sync,gthread,gevent")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--duration", type=float, default=10)
+    p.add_argument("--latency", type=float, default=0.2, help="stub upstream delay per call, seconds")
+    args = p.parse_args()
+
+    base = start_stub(args.latency)
+    os.environ["COINGECKO_BASE_URL"] = base
+    app = make_app(args.database_url)
+    cookie = session_cookie(app)
+
+    env = dict(os.environ, HISTORY_CACHE_MAX_BYTES="0",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    print(f"{args.users} users, {args.workers} workers, upstream latency {args.latency * 1000:.0f} ms, "
+          f"{args.duration:.0f}s per profile")
+    print(f"{'profile':>8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'/ p50 ms':>9}")
+    for profile in args.profiles.split(","):
+        proc, url = start_gunicorn(profile, args.workers, base, env)
+        try:
+            latencies, errors, pages = run_load(url, cookie, args.users, args.duration)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+        print(f"{profile:>8} {len(latencies) / args.duration:>7.1f} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f} {errors:>7} {percentile(pages, 50) * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import json
+import os
+
+# The coin universe: CoinGecko ids, ticker symbols and display names
+COINS_CONFIG = os.environ.get("COINS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "coins.json"))
+
+
+def load_coins(path=COINS_CONFIG):
+    with open(path) as f:
+        return json.load(f)
+
+
+COINS = load_coins()
+
+# CoinGecko coin id -> ticker symbol stored in CryptoPrice
+SYMBOLS = {coin["id"]: coin["symbol"] for coin in COINS}
+
+# Lookups for templates: coins[coin_id] and coins_by_symbol[wallet.currency]
+COINS_BY_ID = {coin["id"]: coin for coin in COINS}
+COINS_BY_SYMBOL = {coin["symbol"]: coin for coin in COINS}
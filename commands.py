@@ -0,0 +1,216 @@
+import time
+
+import click
+from flask import Blueprint
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from app import db
+from money import SCALE, RATE_PRECISION, RATE_SCALE
+
+# (table, column, scale) pairs stored as fixed-point integer minor units
+FIXED_POINT_COLUMNS = [
+    ("wallet", "balance", SCALE),
+    ("transaction", "amount", SCALE),
+    ("transaction", "fee", SCALE)
+]
+
+# transaction.rate was once BIGINT units at this scale; it is now an exact decimal
+LEGACY_RATE_SCALE = 10
+
+# CLI-only blueprint; cli_group=None keeps the commands top-level (flask revalue-portfolios)
+bp = Blueprint("commands", __name__, cli_group=None)
+
+
+@bp.cli.command("revalue-portfolios")
+@click.option("--chunk-size", default=50000, show_default=True, help="Wallet rows per streamed chunk.")
+def revalue_portfolios(chunk_size):
+    """Revalue every wallet against current prices and store portfolio snapshots."""
+    from crypto_api import crypto_api
+    from revaluation import revalue_all_portfolios
+
+    # Never value portfolios at the hard-coded fallback prices
+    crypto_api.refresh_prices()
+    if not crypto_api.cache:
+        crypto_api.sync_snapshot()  # upstream down; fall back to the last stored snapshot
+    if not crypto_api.cache:
+        raise click.ClickException("No live price snapshot available; not revaluing portfolios")
+    prices = crypto_api.cache
+    click.echo(f"Using prices fetched {time.time() - crypto_api.last_fetch_time:.0f}s ago")
+
+    started = time.time()
+    count = revalue_all_portfolios(prices, chunk_size=chunk_size)
+    click.echo(f"Revalued {count} portfolios in {time.time() - started:.2f}s")
+
+
+@bp.cli.command("create-indexes")
+def create_indexes():
+    """Create model indexes missing from existing tables."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+            click.echo(f"Ensured index {index.name}")
+
+
+@bp.cli.command("migrate-fixed-point")
+def migrate_fixed_point():
+    """Convert Float amount columns to BIGINT minor units, and rates to exact decimals, in place."""
+    engine = db.engine
+    inspector = inspect(engine)
+
+    pending = []
+    for table, column, scale in FIXED_POINT_COLUMNS:
+        current = {c["name"]: c["type"] for c in inspector.get_columns(table)}[column]
+        if current.python_type is int:
+            click.echo(f"{table}.{column} is already fixed-point")
+        else:
+            pending.append((table, column, scale))
+
+    # Float before the first migration, BIGINT units after it, then NUMERIC (text on SQLite)
+    rate_type = {c["name"]: c["type"] for c in inspector.get_columns("transaction")}["rate"].python_type
+    if rate_type not in (int, float):
+        click.echo("transaction.rate is already an exact decimal")
+
+    if engine.dialect.name == "postgresql":
+        # Postgres DDL is transactional: every column converts or none does
+        preparer = engine.dialect.identifier_preparer
+        with engine.begin() as conn:
+            for table, column, scale in pending:
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table)} ALTER COLUMN {column} TYPE BIGINT "
+                    f"USING round({column} * {10 ** scale})::bigint"
+                ))
+            if rate_type in (int, float):
+                divisor = f" / {10 ** LEGACY_RATE_SCALE}" if rate_type is int else ""
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote('transaction')} ALTER COLUMN rate "
+                    f"TYPE NUMERIC({RATE_PRECISION}, {RATE_SCALE}) USING rate::numeric{divisor}"
+                ))
+    else:
+        conversions = {}
+        for table, column, scale in pending:
+            conversions.setdefault(table, {})[column] = f"CAST(ROUND({column} * {10 ** scale}) AS INTEGER)"
+        if rate_type is int:
+            # Integer arithmetic, so the text keeps every stored digit
+            unit = 10 ** LEGACY_RATE_SCALE
+            zeros = "0" * LEGACY_RATE_SCALE
+            conversions.setdefault("transaction", {})["rate"] = (
+                f"(rate / {unit}) || '.' || substr('{zeros}' || (rate % {unit}), -{LEGACY_RATE_SCALE})"
+            )
+        elif rate_type is float:
+            conversions.setdefault("transaction", {})["rate"] = "CAST(rate AS TEXT)"
+        _rebuild_sqlite_tables(engine, inspector, conversions)
+
+    for table, column, scale in pending:
+        click.echo(f"Migrated {table}.{column} to 10^-{scale} minor units")
+    if rate_type in (int, float):
+        click.echo("Migrated transaction.rate to an exact decimal")
+
+
+def _rebuild_sqlite_tables(engine, inspector, conversions):
+    """Copy each table into a new one built from its model, in one transaction.
+
+    conversions maps table -> {column: SQL expression for its new value}; other
+    columns are copied as they are. SQLite can't change a column's type or
+    constraints, so the table is rebuilt. pysqlite doesn't open a transaction
+    for DDL on its own; the explicit BEGIN makes the whole migration roll back
+    on any error.
+    """
+    preparer = engine.dialect.identifier_preparer
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN")
+        try:
+            for table, expressions in conversions.items():
+                model_table = db.metadata.tables[table]
+                existing = {c["name"] for c in inspector.get_columns(table)}
+                columns = [c.name for c in model_table.columns if c.name in existing]
+                values = [expressions.get(column, preparer.quote(column)) for column in columns]
+
+                rebuilt = model_table.to_metadata(db.metadata, name=f"{table}_rebuilt")
+                try:
+                    conn.execute(CreateTable(rebuilt))
+                finally:
+                    db.metadata.remove(rebuilt)
+
+                conn.execute(text(
+                    f"INSERT INTO {preparer.quote(rebuilt.name)} ({', '.join(map(preparer.quote, columns))}) "
+                    f"SELECT {', '.join(values)} FROM {preparer.quote(table)}"
+                ))
+                conn.execute(text(f"DROP TABLE {preparer.quote(table)}"))
+                conn.execute(text(f"ALTER TABLE {preparer.quote(rebuilt.name)} RENAME TO {preparer.quote(table)}"))
+                for index in model_table.indexes:
+                    index.create(bind=conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@bp.cli.command("migrate-ledger-constraints")
+def migrate_ledger_constraints():
+    """Add transaction.idempotency_key and the unique keys the ledger relies on."""
+    engine = db.engine
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    transaction_table = preparer.quote("transaction")
+
+    def uniques(table):
+        found = [(c["name"], c["column_names"], False) for c in inspector.get_unique_constraints(table)]
+        found += [(i["name"], i["column_names"], True) for i in inspector.get_indexes(table) if i["unique"]]
+        return found
+
+    def has_unique(table, columns):
+        return any(names == list(columns) for _, names, _ in uniques(table))
+
+    # Idempotency keys are client-supplied, so they are only unique per user
+    global_key = [(name, is_index) for name, names, is_index in uniques("transaction") if names == ["idempotency_key"]]
+    per_user_key = has_unique("transaction", ["user_id", "idempotency_key"])
+
+    # Each step checks first, so a run interrupted part-way can simply be repeated
+    if engine.dialect.name != "postgresql" and (global_key or not per_user_key):
+        # SQLite can't drop or add a table constraint, so the table is rebuilt from the model
+        columns = {c["name"]: c["type"] for c in inspector.get_columns("transaction")}
+        if columns["rate"].python_type in (int, float) or any(
+                columns[column].python_type is not int for table, column, _ in FIXED_POINT_COLUMNS
+                if table == "transaction"):
+            raise click.ClickException("Run flask migrate-fixed-point before migrate-ledger-constraints")
+        _rebuild_sqlite_tables(engine, inspector, {"transaction": {}})
+        click.echo("Rebuilt transaction with uq_transaction_user_idempotency_key")
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            if "idempotency_key" not in {c["name"] for c in inspector.get_columns("transaction")}:
+                conn.execute(text(f"ALTER TABLE {transaction_table} ADD COLUMN idempotency_key VARCHAR(80)"))
+                click.echo("Added transaction.idempotency_key")
+
+            for name, is_index in global_key:
+                if is_index:
+                    conn.execute(text(f"DROP INDEX {preparer.quote(name)}"))
+                else:
+                    conn.execute(text(f"ALTER TABLE {transaction_table} DROP CONSTRAINT {preparer.quote(name)}"))
+                click.echo(f"Dropped global idempotency key {name}")
+
+            if not per_user_key:
+                conn.execute(text(
+                    f"ALTER TABLE {transaction_table} ADD CONSTRAINT uq_transaction_user_idempotency_key "
+                    f"UNIQUE (user_id, idempotency_key)"
+                ))
+                click.echo("Added uq_transaction_user_idempotency_key")
+
+        if not has_unique("wallet", ["user_id", "currency"]):
+            duplicates = conn.execute(text(
+                "SELECT user_id, currency FROM wallet GROUP BY user_id, currency HAVING COUNT(*) > 1"
+            )).fetchall()
+            if duplicates:
+                raise click.ClickException(
+                    f"{len(duplicates)} users have duplicate wallets in one currency "
+                    f"(first: user {duplicates[0][0]} {duplicates[0][1]}); merge them before adding the constraint"
+                )
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("ALTER TABLE wallet ADD CONSTRAINT uq_wallet_user_currency UNIQUE (user_id, currency)"))
+            else:
+                # SQLite can't add a constraint to an existing table; a unique index enforces the same
+                conn.execute(text("CREATE UNIQUE INDEX uq_wallet_user_currency ON wallet (user_id, currency)"))
+            click.echo("Added uq_wallet_user_currency")
+
+    click.echo("Ledger constraints are in place")
@@ -0,0 +1,52 @@
+import numpy as np
+
+from portfolio import usd_prices
+
+
+class ConversionMatrix:
+    """N x N conversion rates for one price snapshot.
+
+    rates[i, j] converts one unit of currency i into currency j. Crypto to
+    crypto pairs go through USD cross rates and the fiat leg uses the live
+    USD->INR rate implied by the snapshot. An extra zero row and column
+    absorb unknown currencies so lookups never raise.
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+
+        usd = usd_prices(prices)
+        self.currencies = list(usd)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+
+        vector = np.array([usd[c] for c in self.currencies], dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = vector[:, None] / vector[None, :]
+        rates = np.where(np.isfinite(rates), rates, 0.0)
+
+        self.rates = np.pad(rates, ((0, 1), (0, 1)))
+
+    def rate(self, from_currency, to_currency):
+        unknown = len(self.currencies)
+        return float(self.rates[self.index.get(from_currency, unknown), self.index.get(to_currency, unknown)])
+
+    def convert(self, amount, from_currency, to_currency):
+        return float(amount) * self.rate(from_currency, to_currency)
+
+    def convert_many(self, amounts, from_currencies, to_currencies):
+        """Vectorized convert; currencies may be a single code or one per amount"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        return amounts * self.rates[self._indices(from_currencies), self._indices(to_currencies)]
+
+    def as_dict(self):
+        """Nested {from: {to: rate}} mapping, e.g. for the trading page script"""
+        return {
+            f: {t: self.rate(f, t) for t in self.currencies if t != f}
+            for f in self.currencies
+        }
+
+    def _indices(self, currencies):
+        unknown = len(self.currencies)
+        if isinstance(currencies, str):
+            return self.index.get(currencies, unknown)
+        return np.array([self.index.get(c, unknown) for c in currencies], dtype=np.intp)
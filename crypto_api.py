@@ -1,161 +1,417 @@
 import os
-import requests
 import logging
 import time
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 from app import db
+from cachetools import TLRUCache
 from models import CryptoPrice
+from money import to_decimal
+from price_cache import create_price_cache
+from http_client import UpstreamClient
+from price_providers import PriceAggregator, CoinGeckoProvider
+from coins import SYMBOLS
+import price_history
+from metrics import timed
+from werkzeug.local import LocalProxy
+
+# Key of the price snapshot in the shared price cache
+PRICE_CACHE_KEY = "crypto_prices:snapshot"
+
+# Chart windows (in days) requests are rounded up to, and how long each stays cached
+HISTORY_DAY_BUCKETS = (1, 7, 14, 30, 90, 180, 365)
+HISTORY_TTLS = {
+    1: 60,
+    7: 5 * 60,
+    14: 10 * 60,
+    30: 30 * 60,
+    90: 60 * 60,
+    180: 3 * 60 * 60,
+    365: 6 * 60 * 60
+}
+
+
+# Served when CoinGecko is unreachable and nothing is cached yet
+FALLBACK_PRICES = {
+    "bitcoin": {
+        "usd": 45000, "inr": 3742500,
+        "usd_24h_change": 2.5,
+        "usd_market_cap": 880000000000,
+        "usd_24h_vol": 25000000000
+    },
+    "ethereum": {
+        "usd": 3200, "inr": 266240,
+        "usd_24h_change": 1.8,
+        "usd_market_cap": 385000000000,
+        "usd_24h_vol": 15000000000
+    },
+    "tether": {
+        "usd": 1.00, "inr": 83.12,
+        "usd_24h_change": 0.01,
+        "usd_market_cap": 95000000000,
+        "usd_24h_vol": 40000000000
+    }
+}
+
+
+def _history_ttu(key, value, now):
+    return now + HISTORY_TTLS[key[1]]
+
+
+def _history_size(value):
+    # Rough in-memory footprint: each [timestamp, value] pair is ~100 bytes
+    return 256 + 100 * sum(len(series) for series in value.values())
+
 
 class CryptoAPI:
+    # CoinGecko coin id -> ticker symbol stored in CryptoPrice (from coins.json)
+    SYMBOLS = SYMBOLS
+
+    # Callables notified with (snapshot, version) whenever the snapshot changes.
+    # Class-level so listeners can register before the lazy instance exists.
+    snapshot_listeners = []
+
     def __init__(self):
-        self.base_url = "https://api.coingecko.com/api/v3"
-        self.supported_coins = ["bitcoin", "ethereum", "tether"]
+        # Overridable so the client can be pointed at a local stub server
+        self.base_url = os.environ.get("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
+        self.supported_coins = list(self.SYMBOLS)
 
         # Caching setup
         self.cache = {}
         self.last_fetch_time = 0
         self.cache_ttl = 60  # 1 min cache
 
+        # Snapshot cache shared across gunicorn workers (memory://, sqlite:///path, redis://host)
+        self.price_cache = create_price_cache(os.environ.get("PRICE_CACHE_URL"))
+
+        # Chart data cache, bounded by an approximate memory budget in bytes
+        self.history_cache = TLRUCache(
+            maxsize=int(os.environ.get("HISTORY_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+            ttu=_history_ttu,
+            getsizeof=_history_size
+        )
+        self._history_lock = threading.Lock()
+        self._history_key_locks = {}
+
         # Optional CoinGecko Pro API key
         self.api_key = os.environ.get("COINGECKO_API_KEY")
 
+        # Pooled keep-alive client with retries and a circuit breaker
+        self.client = UpstreamClient(
+            self.base_url,
+            headers={"x-cg-pro-api-key": self.api_key} if self.api_key else None
+        )
+
+        # Price sources queried concurrently on every refresh
+        self.aggregator = PriceAggregator(
+            self._build_providers(),
+            method=os.environ.get("PRICE_AGGREGATION", "median")
+        )
+
+        # Rebuilt once per price snapshot (see get_conversion_matrix)
+        self._conversion_matrix = None
+
+        # Background refresher (see start_refresher)
+        self.refresher = None
+
+    @timed("get_crypto_prices")
     def get_crypto_prices(self):
-        """Fetch real-time crypto prices from CoinGecko API with caching"""
+        """Return crypto prices, served from the in-memory snapshot when possible"""
+        if self.refresher and self.refresher.is_running():
+            # The refresher keeps the snapshot warm; never block on upstream here
+            return self.cache or self._get_fallback_prices()
+
+        now = time.time()
+        if now - self.last_fetch_time < self.cache_ttl and self.cache:
+            return self.cache  # serve cached data
+
+        # Concurrent misses across workers collapse into a single upstream fetch
+        try:
+            entry = self.price_cache.get_or_fetch(PRICE_CACHE_KEY, self._fetch_snapshot, self.cache_ttl)
+        except Exception as e:
+            logging.error(f"Price cache error: {e}")
+            entry = self._fetch_snapshot()
+
+        if entry:
+            self._adopt_snapshot(entry)
+        return self.cache or self._get_fallback_prices()
+
+    @timed("refresh_prices")
+    def refresh_prices(self):
+        """Fetch a fresh snapshot and publish it to the shared price cache"""
+        entry = self._fetch_snapshot()
+        if entry:
+            try:
+                self.price_cache.set(PRICE_CACHE_KEY, entry, self.cache_ttl)
+            except Exception as e:
+                logging.error(f"Price cache error: {e}")
+        return self.cache or self._get_fallback_prices()
+
+    @timed("sync_snapshot")
+    def sync_snapshot(self):
+        """Adopt the newest snapshot published by another process"""
+        if self.price_cache.shared:
+            try:
+                entry = self.price_cache.get(PRICE_CACHE_KEY)
+            except Exception as e:
+                logging.error(f"Price cache error: {e}")
+                entry = None
+
+            if entry:
+                self._adopt_snapshot(entry)
+                return self.cache
+
+        return self.load_snapshot_from_database()
+
+    def _build_providers(self):
+        """Providers from PRICE_PROVIDERS ("name=base_url,..."), CoinGecko by default"""
+        budget = float(os.environ.get("PRICE_PROVIDER_BUDGET", 5))
+        spec = os.environ.get("PRICE_PROVIDERS")
+        if not spec:
+            return [CoinGeckoProvider("coingecko", self.client, budget)]
+
+        providers = []
+        for item in spec.split(","):
+            name, _, url = item.strip().partition("=")
+            client = self.client if url.rstrip("/") == self.base_url.rstrip("/") else UpstreamClient(url)
+            providers.append(CoinGeckoProvider(name, client, budget))
+        return providers
+
+    def _fetch_snapshot(self):
+        """Fetch real-time crypto prices from every provider and aggregate them"""
         try:
             now = time.time()
-            if now - self.last_fetch_time < self.cache_ttl and self.cache:
-                return self.cache  # serve cached data
-
-            coins = ",".join(self.supported_coins)
-            url = f"{self.base_url}/simple/price"
-            params = {
-                "ids": coins,
-                "vs_currencies": "usd,inr",
-                "include_24hr_change": "true",
-                "include_market_cap": "true",
-                "include_24hr_vol": "true"
-            }
-
-            headers = {}
-            if self.api_key:
-                headers["x-cg-pro-api-key"] = self.api_key
-
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            # Update database + cache
+            data = self.aggregator.fetch(self.supported_coins)
+            if not data:
+                logging.error("No price provider answered within its latency budget")
+                return None
+
+            # Update database + price history + cache
             self._update_price_database(data)
-            self.cache = data
-            self.last_fetch_time = now
+            price_history.record_snapshot(data, self.SYMBOLS)
+            entry = {"fetched_at": now, "data": data}
+            self._adopt_snapshot(entry)
 
-            return data
+            return entry
 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching crypto prices: {e}")
-            return self.cache or self._get_fallback_prices()
         except Exception as e:
             logging.error(f"Unexpected error in crypto API: {e}")
-            return self.cache or self._get_fallback_prices()
+            return None
+
+    def _adopt_snapshot(self, entry):
+        if entry["fetched_at"] <= self.last_fetch_time and self.cache:
+            return
+
+        self.cache = entry["data"]
+        self.last_fetch_time = entry["fetched_at"]
+
+        for listener in self.snapshot_listeners:
+            try:
+                listener(self.cache, self.last_fetch_time)
+            except Exception as e:
+                logging.error(f"Price snapshot listener error: {e}")
 
     def _update_price_database(self, data):
-        """Update the database with latest crypto prices"""
+        """Upsert the latest crypto prices in a single statement"""
         try:
-            symbol_mapping = {
-                "bitcoin": "BTC",
-                "ethereum": "ETH",
-                "tether": "USDT"
-            }
-
-            for coin_id, coin_data in data.items():
-                symbol = symbol_mapping.get(coin_id)
-                if symbol:
-                    price_record = CryptoPrice.query.filter_by(symbol=symbol).first()
-
-                    if not price_record:
-                        price_record = CryptoPrice(symbol=symbol)
-                        db.session.add(price_record)
-
-                    price_record.current_price_usd = coin_data.get("usd", 0)
-                    price_record.current_price_inr = coin_data.get("inr", 0)
-                    price_record.price_change_24h = coin_data.get("usd_24h_change", 0)
-                    price_record.market_cap = coin_data.get("usd_market_cap", 0)
-                    price_record.volume_24h = coin_data.get("usd_24h_vol", 0)
-                    price_record.last_updated = datetime.utcnow()
+            now = datetime.utcnow()
+            rows = [
+                {
+                    "symbol": self.SYMBOLS[coin_id],
+                    "current_price_usd": coin_data.get("usd", 0),
+                    "current_price_inr": coin_data.get("inr", 0),
+                    "price_change_24h": coin_data.get("usd_24h_change", 0),
+                    "market_cap": coin_data.get("usd_market_cap", 0),
+                    "volume_24h": coin_data.get("usd_24h_vol", 0),
+                    "last_updated": now
+                }
+                for coin_id, coin_data in data.items()
+                if coin_id in self.SYMBOLS
+            ]
+            if not rows:
+                return
+
+            dialect = db.engine.dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            elif dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                self._merge_price_rows(rows)
+                db.session.commit()
+                return
 
+            stmt = insert(CryptoPrice).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CryptoPrice.symbol],
+                set_={column: stmt.excluded[column] for column in rows[0] if column != "symbol"}
+            )
+            db.session.execute(stmt)
             db.session.commit()
 
         except Exception as e:
             logging.error(f"Error updating price database: {e}")
             db.session.rollback()
 
+    def _merge_price_rows(self, rows):
+        """Row-by-row fallback for databases without ON CONFLICT support"""
+        records = {
+            r.symbol: r for r in
+            CryptoPrice.query.filter(CryptoPrice.symbol.in_([row["symbol"] for row in rows])).all()
+        }
+        for row in rows:
+            price_record = records.get(row["symbol"])
+            if not price_record:
+                price_record = CryptoPrice(symbol=row["symbol"])
+                db.session.add(price_record)
+            for column, value in row.items():
+                setattr(price_record, column, value)
+
+    def load_snapshot_from_database(self):
+        """Adopt the snapshot another process wrote to the CryptoPrice table"""
+        try:
+            coin_ids = {symbol: coin_id for coin_id, symbol in self.SYMBOLS.items()}
+            records = CryptoPrice.query.filter(CryptoPrice.symbol.in_(coin_ids)).all()
+            if not records:
+                return self.cache
+
+            last_updated = max(r.last_updated for r in records if r.last_updated)
+            fetched_at = last_updated.replace(tzinfo=timezone.utc).timestamp()
+            if fetched_at <= self.last_fetch_time:
+                return self.cache
+
+            # Through _adopt_snapshot so SSE listeners on follower workers hear about it
+            self._adopt_snapshot({
+                "fetched_at": fetched_at,
+                "data": {
+                    coin_ids[r.symbol]: {
+                        "usd": r.current_price_usd, "inr": r.current_price_inr,
+                        "usd_24h_change": r.price_change_24h,
+                        "usd_market_cap": r.market_cap,
+                        "usd_24h_vol": r.volume_24h
+                    }
+                    for r in records
+                }
+            })
+            return self.cache
+
+        except Exception as e:
+            logging.error(f"Error loading price snapshot from database: {e}")
+            db.session.rollback()
+            return self.cache
+
+    def start_refresher(self, app, **kwargs):
+        """Start the background thread that keeps the price snapshot warm"""
+        from price_refresher import PriceRefresher
+
+        if self.refresher is None:
+            self.refresher = PriceRefresher(app, self, **kwargs)
+        self.refresher.start()
+        return self.refresher
+
     def _get_fallback_prices(self):
         """Return fallback prices if API fails"""
-        return {
-            "bitcoin": {
-                "usd": 45000, "inr": 3742500,
-                "usd_24h_change": 2.5,
-                "usd_market_cap": 880000000000,
-                "usd_24h_vol": 25000000000
-            },
-            "ethereum": {
-                "usd": 3200, "inr": 266240,
-                "usd_24h_change": 1.8,
-                "usd_market_cap": 385000000000,
-                "usd_24h_vol": 15000000000
-            },
-            "tether": {
-                "usd": 1.00, "inr": 83.12,
-                "usd_24h_change": 0.01,
-                "usd_market_cap": 95000000000,
-                "usd_24h_vol": 40000000000
-            }
-        }
+        return FALLBACK_PRICES
 
+    @timed("get_historical_data")
     def get_historical_data(self, coin_id, days=7):
-        """Get historical price data for charts"""
+        """Get historical price data for charts, cached per (coin_id, days bucket)"""
+        if coin_id not in self.SYMBOLS:
+            # coin_id comes from the URL; unknown ids must not grow the cache or reach upstream
+            raise KeyError(coin_id)
+        days = self.normalize_days(days)
+        key = (coin_id, days)
+
+        with self._history_lock:
+            data = self.history_cache.get(key)
+        if data is not None:
+            return data
+
+        # Concurrent requests for the same chart wait for the first one
+        with self._history_lock:
+            key_lock = self._history_key_locks.setdefault(key, threading.Lock())
+
         try:
-            url = f"{self.base_url}/coins/{coin_id}/market_chart"
-            params = {"vs_currency": "usd", "days": days}
+            with key_lock:
+                with self._history_lock:
+                    data = self.history_cache.get(key)
+                if data is not None:
+                    return data
+
+                data = self._load_historical_data(coin_id, days)
+                if data.get("prices"):
+                    try:
+                        with self._history_lock:
+                            self.history_cache[key] = data
+                    except ValueError:
+                        pass  # larger than the whole memory budget
+                return data
+        finally:
+            # Waiters already hold the lock object; later callers find the cache filled
+            with self._history_lock:
+                if self._history_key_locks.get(key) is key_lock:
+                    del self._history_key_locks[key]
 
-            headers = {}
-            if self.api_key:
-                headers["x-cg-pro-api-key"] = self.api_key
+    def normalize_days(self, days):
+        """Round a chart window up to the nearest supported bucket"""
+        for bucket in HISTORY_DAY_BUCKETS:
+            if days <= bucket:
+                return bucket
+        return HISTORY_DAY_BUCKETS[-1]
 
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
+    def _load_historical_data(self, coin_id, days):
+        # Serve from the local candle store when it covers the window
+        symbol = self.SYMBOLS.get(coin_id)
+        if symbol:
+            local = price_history.get_chart(symbol, days)
+            if local is not None:
+                return local
+
+        try:
+            params = {"vs_currency": "usd", "days": days}
+            return self.client.get_json(f"/coins/{coin_id}/market_chart", params=params)
 
         except Exception as e:
             logging.error(f"Error fetching historical data: {e}")
             return {"prices": [], "market_caps": [], "total_volumes": []}
 
+    def get_conversion_matrix(self):
+        """Conversion rates for the current snapshot, rebuilt only when it changes"""
+        prices = self.get_crypto_prices()
+        matrix = self._conversion_matrix
+        if matrix is None or matrix.prices is not prices:
+            from conversion import ConversionMatrix
+            matrix = ConversionMatrix(prices)
+            self._conversion_matrix = matrix
+        return matrix
+
+    @timed("convert_currency")
     def convert_currency(self, amount, from_currency, to_currency):
         """Convert between cryptocurrencies and fiat"""
         try:
-            prices = self.get_crypto_prices()
+            return to_decimal(self.get_conversion_matrix().convert(amount, from_currency, to_currency))
+        except Exception as e:
+            logging.error(f"Error converting currency: {e}")
+            return 0
 
-            # Fiat conversions
-            if from_currency == "USD" and to_currency == "INR":
-                return amount * 83.12
-            elif from_currency == "INR" and to_currency == "USD":
-                return amount / 83.12
+    def convert_many(self, amounts, from_currencies, to_currencies):
+        """Vectorized conversion for batch quoting; see ConversionMatrix.convert_many"""
+        return self.get_conversion_matrix().convert_many(amounts, from_currencies, to_currencies)
 
-            # Crypto conversions
-            coin_mapping = {"BTC": "bitcoin", "ETH": "ethereum", "USDT": "tether"}
+# Global instance
+_instance = None
+_instance_lock = threading.Lock()
 
-            if from_currency in coin_mapping:
-                coin_data = prices.get(coin_mapping[from_currency], {})
-                if to_currency == "USD":
-                    return amount * coin_data.get("usd", 0)
-                elif to_currency == "INR":
-                    return amount * coin_data.get("inr", 0)
 
-            return 0
+def get_crypto_api():
+    """The process-wide CryptoAPI, built on first use (after fork under gunicorn preload_app)"""
+    global _instance
 
-        except Exception as e:
-            logging.error(f"Error converting currency: {e}")
-            return 0
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = CryptoAPI()
+    return _instance
 
-# Global instance
-crypto_api = CryptoAPI()
+
+crypto_api = LocalProxy(get_crypto_api)
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from metrics import Counter, Histogram, collectors, stats_lines
+
+# Connections this service may hold on the database, across every worker
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 90))
+# Connections kept outside request handling: the price refresher and its leader lock
+RESERVED_CONNECTIONS = 2
+
+# Connections idle longer than this are pinged on checkout; busier ones are trusted
+DB_PING_IDLE_SECONDS = float(os.environ.get("DB_PING_IDLE_SECONDS", 60))
+
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, float("inf"))
+
+# journal_mode=WAL lets readers proceed while a writer commits; the rest trade
+# a little durability on power loss for far fewer fsyncs in local/dev use
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+checkout_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", (),
+                          buckets=CHECKOUT_WAIT_BUCKETS)
+pool_events = Counter("db_pool_events_total", "Pool timeouts, idle pings and stale connections replaced", ("event",))
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_events.inc("timeout")
+            raise
+        finally:
+            checkout_wait.observe(time.perf_counter() - started)
+
+
+def pool_settings(workers=None, concurrency=None):
+    """pool_size / max_overflow for one worker, from the gunicorn profile.
+
+    Each worker gets an equal share of DB_MAX_CONNECTIONS. It keeps enough
+    connections for every in-flight request plus the reserved ones, and may
+    burst into the rest of its share before callers queue on pool_timeout.
+    """
+    workers = workers or int(os.environ.get("WEB_CONCURRENCY", 1))
+    concurrency = concurrency or int(os.environ.get("WORKER_CONCURRENCY", 1))
+
+    share = max(RESERVED_CONNECTIONS + 1, DB_MAX_CONNECTIONS // workers)
+    pool_size = min(concurrency + RESERVED_CONNECTIONS, share)
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", share - pool_size)),
+    }
+
+
+def engine_options(db_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for db_url"""
+    options = {
+        # Render's Postgres drops idle connections after ~5 minutes
+        "pool_recycle": 280,
+        # Replaced by the idle-only ping below; a round trip on every checkout is too costly
+        "pool_pre_ping": False,
+    }
+    if db_url.startswith("sqlite") and (":memory:" in db_url or db_url.rstrip("/") == "sqlite:"):
+        return options  # in-memory SQLite uses a single static connection
+
+    options.update(pool_settings())
+    options["pool_timeout"] = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    options["poolclass"] = MeteredQueuePool
+    return options
+
+
+@event.listens_for(MeteredQueuePool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+    connection_record.info["idle_since"] = time.monotonic()
+
+
+@event.listens_for(MeteredQueuePool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    connection_record.info["idle_since"] = time.monotonic()
+
+
+@event.listens_for(MeteredQueuePool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    idle_since = connection_record.info.get("idle_since")
+    if idle_since is None or time.monotonic() - idle_since < DB_PING_IDLE_SECONDS:
+        return
+
+    pool_events.inc("ping")
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except Exception:
+        pool_events.inc("stale")
+        # The pool discards this connection and retries the checkout with a fresh one
+        raise exc.DisconnectionError()
+
+
+def _pool_lines():
+    from app import db
+
+    pool = db.engine.pool
+    lines = checkout_wait.render() + pool_events.render()
+    if isinstance(pool, QueuePool):
+        lines += stats_lines("db_pool", {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "in_use": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+        })
+    return lines
+
+
+collectors.append(_pool_lines)
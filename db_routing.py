@@ -0,0 +1,131 @@
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from metrics import Counter, collectors
+
+# Comma-separated read replicas of DATABASE_URL; empty sends every query to the primary
+REPLICA_URLS = [
+    url.strip().replace("postgres://", "postgresql://", 1)
+    for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_KEYS = [f"replica_{i}" for i in range(len(REPLICA_URLS))]
+
+# Replicas further behind than this are skipped. A user who wrote within this
+# window reads from the primary, so they always see their own writes.
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get("REPLICA_LAG_CHECK_INTERVAL", 5))
+
+# Flask session key holding when this user last wrote
+LAST_WRITE_KEY = "_db_last_write"
+
+# 0 when the replica has replayed everything it received, else seconds since its last replayed commit
+PG_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+routed_reads = Counter("db_routed_reads_total", "Read-only requests by database chosen", ("target",))
+collectors.append(routed_reads.render)
+
+_round_robin = itertools.count()
+_lag = {}  # bind key -> (checked_at, lag seconds)
+_lag_lock = threading.Lock()
+
+
+def replica_binds(engine_options):
+    """SQLALCHEMY_BINDS entries for the configured replicas"""
+    return {key: {"url": url, **engine_options(url)} for key, url in zip(REPLICA_KEYS, REPLICA_URLS)}
+
+
+def read_only(view):
+    """Mark a view's GET requests as safe to serve from a replica"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session sending SELECTs of read-only requests to a replica, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, "is_select", False):
+            engine = self._replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        if not REPLICA_KEYS or not has_request_context() or not g.get("db_read_only"):
+            return None
+        # Pinned per request so one page never mixes two replicas' views of the data
+        if "db_replica" not in g:
+            key = self._choose_replica()
+            g.db_replica = self._db.engines[key] if key else None
+            routed_reads.inc(key or "primary")
+        return g.db_replica
+
+    def _choose_replica(self):
+        last_write = session.get(LAST_WRITE_KEY)
+        if last_write and time.time() - last_write < REPLICA_MAX_LAG:
+            return None  # read-your-writes: replicas may not have this user's write yet
+
+        engines = self._db.engines
+        start = next(_round_robin)
+        for i in range(len(REPLICA_KEYS)):
+            key = REPLICA_KEYS[(start + i) % len(REPLICA_KEYS)]
+            if replica_lag(key, engines[key]) <= REPLICA_MAX_LAG:
+                return key
+        return None
+
+
+def replica_lag(key, engine):
+    """Replication lag in seconds, re-measured at most every REPLICA_LAG_CHECK_INTERVAL"""
+    now = time.time()
+    with _lag_lock:
+        checked_at, lag = _lag.get(key, (0, 0.0))
+        if now - checked_at < REPLICA_LAG_CHECK_INTERVAL:
+            return lag
+        # Claim the check so concurrent requests keep using the last value meanwhile
+        _lag[key] = (now, lag)
+
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as conn:
+                lag = float(conn.execute(PG_REPLICA_LAG_SQL).scalar() or 0)
+        else:
+            lag = 0.0  # e.g. a second SQLite file for local testing; no replication to measure
+    except Exception as e:
+        logging.error(f"Replica {key} lag check failed: {e}")
+        lag = float("inf")
+
+    with _lag_lock:
+        _lag[key] = (now, lag)
+    return lag
+
+
+def _remember_write():
+    if REPLICA_KEYS and has_request_context():
+        session[LAST_WRITE_KEY] = time.time()
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(db_session, flush_context):
+    _remember_write()
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _on_execute(orm_execute_state):
+    # Bulk insert()/update() statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _remember_write()
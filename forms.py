@@ -1,8 +1,16 @@
+from decimal import Decimal
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, EmailField, SelectField, FloatField, TextAreaField
+from wtforms import StringField, PasswordField, EmailField, SelectField, DecimalField, TextAreaField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange
 from wtforms.widgets import FileInput
 from flask_wtf.file import FileField, FileAllowed
+from coins import COINS
+
+FIAT_CHOICES = [
+    ('INR', 'Indian Rupee'),
+    ('USD', 'US Dollar')
+]
+CURRENCY_CHOICES = FIAT_CHOICES + [(coin['symbol'], coin['name']) for coin in COINS]
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[
@@ -45,29 +53,18 @@ class TransactionForm(FlaskForm):
         ('convert', 'Convert'),
         ('send', 'Send')
     ], validators=[DataRequired()])
-    from_currency = SelectField('From Currency', choices=[
-        ('INR', 'Indian Rupee'),
-        ('USD', 'US Dollar'),
-        ('BTC', 'Bitcoin'),
-        ('ETH', 'Ethereum'),
-        ('USDT', 'Tether')
-    ], validators=[DataRequired()])
-    to_currency = SelectField('To Currency', choices=[
-        ('INR', 'Indian Rupee'),
-        ('USD', 'US Dollar'),
-        ('BTC', 'Bitcoin'),
-        ('ETH', 'Ethereum'),
-        ('USDT', 'Tether')
-    ], validators=[DataRequired()])
-    amount = FloatField('Amount', validators=[
+    from_currency = SelectField('From Currency', choices=CURRENCY_CHOICES, validators=[DataRequired()])
+    to_currency = SelectField('To Currency', choices=CURRENCY_CHOICES, validators=[DataRequired()])
+    amount = DecimalField('Amount', validators=[
         DataRequired(),
-        NumberRange(min=0.00001, message='Amount must be greater than 0')
+        NumberRange(min=Decimal('0.00001'), message='Amount must be greater than 0')
     ])
     recipient_address = StringField('Recipient Address (for send transactions)')
+    idempotency_key = HiddenField()
 
 class PaymentForm(FlaskForm):
     recipient_email = EmailField('Recipient Email', validators=[DataRequired(), Email()])
-    amount = FloatField('Amount', validators=[
+    amount = DecimalField('Amount', validators=[
         DataRequired(),
         NumberRange(min=1, message='Amount must be at least 1')
     ])
@@ -76,3 +73,4 @@ class PaymentForm(FlaskForm):
         ('USD', 'US Dollar')
     ], validators=[DataRequired()])
     note = TextAreaField('Note (Optional)', validators=[Length(max=200)])
+    idempotency_key = HiddenField()
@@ -0,0 +1,70 @@
+import threading
+
+from flask import render_template, request, session
+from markupsafe import Markup
+
+from crypto_api import crypto_api
+
+# (template, key) -> (prices, version, html); one entry per fragment variant, replaced every tick
+_fragments = {}
+_pages = {}  # endpoint -> (prices, version, html)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "page_hits": 0, "page_misses": 0}
+
+
+def snapshot_version(prices):
+    """Version of a price dict: the fetch time for live snapshots, 0 for fallbacks"""
+    return crypto_api.last_fetch_time if prices is crypto_api.cache else 0
+
+
+def price_fragment(template, prices, **key):
+    """Render a price-only partial once per snapshot and reuse it for every user.
+
+    The partial sees only `prices`, static globals such as `coins`, and the `key`
+    arguments, which become part of the cache key (e.g. locale or display
+    currency), so it must not touch current_user, csrf tokens or anything
+    else per-request.
+    """
+    version = snapshot_version(prices)
+    cache_key = (template, tuple(sorted(key.items())))
+
+    entry = _fragments.get(cache_key)
+    if entry is not None and entry[0] is prices and entry[1] == version:
+        _count("hits")
+        return entry[2]
+
+    _count("misses")
+    html = Markup(render_template(template, prices=prices, **key))
+    _fragments[cache_key] = (prices, version, html)
+    return html
+
+
+def cached_page(render, prices):
+    """Full-page cache for pages that are identical for every anonymous visitor.
+
+    Rebuilt once per snapshot. A pending flash message makes the page
+    visitor-specific, so it is rendered fresh and not stored.
+    """
+    if session.get("_flashes"):
+        return render()
+
+    version = snapshot_version(prices)
+    page = _pages.get(request.endpoint)
+    if page is not None and page[0] is prices and page[1] == version:
+        _count("page_hits")
+        return page[2]
+
+    _count("page_misses")
+    html = render()
+    _pages[request.endpoint] = (prices, version, html)
+    return html
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
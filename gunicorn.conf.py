@@ -0,0 +1,70 @@
+import os
+
+# Serving profiles, picked with GUNICORN_PROFILE:
+#   sync    - one request per worker; a slow upstream or an SSE client holds the whole worker
+#   gthread - a thread pool per worker; blocking I/O only holds one thread (default)
+#   gevent  - cooperative greenlets; requests, psycopg2 (via psycogreen) and sleeps yield
+#             instead of blocking, so one worker holds hundreds of waiting clients
+PROFILE = os.environ.get("GUNICORN_PROFILE", "gthread")
+if PROFILE not in ("sync", "gthread", "gevent"):
+    raise ValueError(f"Unknown GUNICORN_PROFILE {PROFILE!r}; expected sync, gthread or gevent")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# db_pool splits DB_MAX_CONNECTIONS by this; without it each worker would claim the whole budget
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = PROFILE
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+if PROFILE == "gthread":
+    threads = int(os.environ.get("GUNICORN_THREADS", 8))
+    concurrency = threads
+    stream_clients = threads // 2  # the other half stays free for page requests
+elif PROFILE == "gevent":
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 200))
+    concurrency = worker_connections
+    stream_clients = worker_connections // 2
+else:
+    concurrency = 1
+    stream_clients = 0  # a stream would hold the only request slot; clients poll instead
+
+# Requests one worker can have in flight; app.py sizes the DB pool from it
+os.environ["WORKER_CONCURRENCY"] = str(concurrency)
+# Open SSE price streams per worker before /api/prices/stream answers 503
+os.environ.setdefault("PRICE_STREAM_MAX_CLIENTS", str(stream_clients))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+
+# Import the app once in the master so workers share its memory copy-on-write.
+# DB connections don't survive fork, so post_fork drops them; background threads
+# start in post_worker_init, once per worker.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+if preload_app:
+    if PROFILE == "gevent":
+        # Patch before the app creates any locks or sockets in the master
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import db
+
+        with server.app.wsgi().app_context():
+            # Drop pooled connections inherited from the master without closing its sockets
+            db.engine.dispose(close=False)
+
+    if PROFILE == "gevent":
+        # psycopg2 is a C extension that monkey-patching can't reach; make it yield to the hub
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; Postgres queries will block gevent workers")
+
+
+def post_worker_init(worker):
+    # The worker has loaded (or inherited) the app by now, with or without preload
+    from app import start_background_tasks
+    start_background_tasks(worker.wsgi)
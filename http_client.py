@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upper bounds (seconds) of the upstream latency histogram
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True  # let exactly one trial call through
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self, hold_for=None):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.time()
+            if hold_for:
+                # Upstream told us when to come back (Retry-After)
+                self.opened_at = time.time() - self.reset_timeout + hold_for
+
+
+class UpstreamClient:
+    """Keep-alive HTTP client with bounded pool, retries, circuit breaker and latency metrics"""
+
+    def __init__(self, base_url, headers=None, timeout=(3.05, 10), max_retries=2,
+                 backoff_base=0.5, backoff_max=8, pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "errors": 0, "retries": 0, "short_circuited": 0, "latency_sum": 0.0}
+        self._latency_counts = [0] * len(LATENCY_BUCKETS)
+
+    def get_json(self, path, params=None):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+        url = f"{self.base_url}{path}"
+        response, error, retry_after = None, None, None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    delay = retry_after if retry_after is not None else self._backoff(attempt)
+                    if delay > self.backoff_max:
+                        break  # upstream wants longer than we are willing to block
+                    self._count("retries")
+                    time.sleep(delay)
+
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                    data = response.json() if response.status_code < 400 else None
+                except requests.exceptions.RequestException as e:
+                    # Connect/read timeouts, dropped or undecodable bodies, redirect loops, non-JSON 200s
+                    self._observe(time.perf_counter() - started, ok=False)
+                    response, error, retry_after = None, e, None
+                    continue
+
+                self._observe(time.perf_counter() - started, ok=response.status_code < 400)
+                if response.status_code in RETRY_STATUSES:
+                    error = requests.exceptions.HTTPError(f"{response.status_code} from {url}", response=response)
+                    retry_after = self._retry_after(response)
+                    response = None
+                    continue
+                break
+        except BaseException:
+            # Anything else (a bug, a gevent Timeout) must still end a half-open probe
+            self.breaker.record_failure()
+            raise
+
+        if response is None:
+            self.breaker.record_failure(hold_for=retry_after)
+            raise error
+
+        # Other 4xx are our fault, not upstream's; don't trip the breaker
+        self.breaker.record_success()
+        response.raise_for_status()
+        return data
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, latency_buckets=list(zip(LATENCY_BUCKETS, self._latency_counts)),
+                        circuit=self.breaker.state)
+
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def _observe(self, seconds, ok):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["latency_sum"] += seconds
+            if not ok:
+                self._stats["errors"] += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self._latency_counts[i] += 1
+                    break
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
@@ -0,0 +1,174 @@
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db
+from models import Wallet, Transaction
+from money import to_decimal, RATE_SCALE
+
+# Attempts for transient lock/serialization failures before giving up
+MAX_ATTEMPTS = 3
+
+
+class LedgerError(Exception):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class IdempotencyConflict(LedgerError):
+    """A reused idempotency key whose request differs from the one it first recorded"""
+
+
+def execute_trade(user_id, transaction_type, from_currency, to_currency,
+                  amount, converted_amount, fee, idempotency_key=None):
+    """Move amount out of one of a user's wallets and converted_amount into another"""
+    amount, converted_amount, fee = to_decimal(amount), to_decimal(converted_amount), to_decimal(fee)
+
+    def apply():
+        wallets = _lock_wallets([(user_id, from_currency), (user_id, to_currency)])
+        _debit(wallets[(user_id, from_currency)], amount)
+        _credit(wallets[(user_id, to_currency)], converted_amount)
+
+        transaction = Transaction(
+            user_id=user_id,
+            transaction_type=transaction_type,
+            from_currency=from_currency,
+            to_currency=to_currency,
+            amount=amount,
+            rate=to_decimal(converted_amount / (amount or 1), RATE_SCALE),
+            fee=fee,
+            status='completed',
+            idempotency_key=idempotency_key,
+            completed_at=datetime.utcnow()
+        )
+        db.session.add(transaction)
+        return transaction
+
+    request = {'transaction_type': transaction_type, 'from_currency': from_currency,
+               'to_currency': to_currency, 'amount': amount}
+    return _execute(apply, user_id, idempotency_key, request)
+
+
+def execute_payment(sender_id, recipient_id, recipient_email, currency, amount, fee, idempotency_key=None):
+    """Debit amount plus fee from the sender and credit amount to the recipient"""
+    amount, fee = to_decimal(amount), to_decimal(fee)
+
+    def apply():
+        wallets = _lock_wallets([(sender_id, currency), (recipient_id, currency)])
+        _debit(wallets[(sender_id, currency)], amount + fee)
+        _credit(wallets[(recipient_id, currency)], amount)
+
+        completed_at = datetime.utcnow()
+        send_transaction = Transaction(
+            user_id=sender_id,
+            transaction_type='send',
+            from_currency=currency,
+            to_currency=currency,
+            amount=amount,
+            fee=fee,
+            status='completed',
+            recipient_address=recipient_email,
+            idempotency_key=idempotency_key,
+            completed_at=completed_at
+        )
+        receive_transaction = Transaction(
+            user_id=recipient_id,
+            transaction_type='receive',
+            from_currency=currency,
+            to_currency=currency,
+            amount=amount,
+            fee=0,
+            status='completed',
+            idempotency_key=f"{idempotency_key}:receive" if idempotency_key else None,
+            completed_at=completed_at
+        )
+        db.session.add(send_transaction)
+        db.session.add(receive_transaction)
+        return send_transaction
+
+    request = {'transaction_type': 'send', 'from_currency': currency, 'to_currency': currency,
+               'amount': amount, 'recipient_address': recipient_email}
+    return _execute(apply, sender_id, idempotency_key, request)
+
+
+def _execute(apply, user_id, idempotency_key, request):
+    """Run apply() in one transaction, replaying the stored result for a reused key"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        existing = _find_by_key(user_id, idempotency_key, request)
+        if existing:
+            return existing
+
+        try:
+            transaction = apply()
+            db.session.commit()
+            return transaction
+
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            db.session.rollback()
+            existing = _find_by_key(user_id, idempotency_key, request)
+            if existing:
+                return existing
+            raise
+
+        except OperationalError as e:
+            # Lock timeouts, deadlocks and SQLite "database is locked"
+            db.session.rollback()
+            if attempt == MAX_ATTEMPTS:
+                raise
+            logging.warning(f"Retrying ledger transaction after error: {e}")
+            time.sleep(0.05 * attempt)
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def _find_by_key(user_id, idempotency_key, request):
+    """This user's transaction recorded under the key, if it was for the same request"""
+    if not idempotency_key:
+        return None
+    # Keys come from a form field, so they are only unique per user
+    existing = Transaction.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+    if existing and any(getattr(existing, field) != value for field, value in request.items()):
+        raise IdempotencyConflict(f"Idempotency key {idempotency_key} was used for a different transaction")
+    return existing
+
+
+def _lock_wallets(keys):
+    """Lock the (user_id, currency) wallets in a fixed order, creating missing ones"""
+    wallets = {}
+    for user_id, currency in sorted(set(keys)):
+        wallet = Wallet.query.filter_by(user_id=user_id, currency=currency)\
+            .with_for_update().first()
+        if not wallet:
+            wallet = Wallet(user_id=user_id, currency=currency, balance=0)
+            db.session.add(wallet)
+            db.session.flush()
+        wallets[(user_id, currency)] = wallet
+    return wallets
+
+
+def _debit(wallet, amount):
+    # Guarded update: a compare-and-swap even where FOR UPDATE is a no-op (SQLite)
+    result = db.session.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet.id, Wallet.balance >= amount)
+        .values(balance=Wallet.balance - amount)
+    )
+    if result.rowcount != 1:
+        raise InsufficientFunds(f"Insufficient {wallet.currency} balance")
+
+
+def _credit(wallet, amount):
+    db.session.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet.id)
+        .values(balance=Wallet.balance + amount)
+    )
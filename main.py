@@ -1,4 +1,11 @@
-from app import app
+import os
+
+from app import create_app, start_background_tasks
+
+app = create_app()
 
 if __name__ == "__main__":
+    # The debug reloader runs this file twice; only its serving child starts the refresher
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_tasks(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
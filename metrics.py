@@ -0,0 +1,354 @@
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (seconds) of the request / call latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+# Upper bounds of the queries-per-request histogram
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, float("inf"))
+
+# Optional bearer token guarding /metrics; unset leaves it open (e.g. behind a private network)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Opt-in profiler: profile this fraction of requests, keep a dump only when slower than the threshold
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 500))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Requests slower than this get a one-line SQL / upstream / render breakdown in the log
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+
+
+class Histogram:
+    """Labelled histogram rendered in the Prometheus text format"""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            pairs = list(zip(self.labels, label_values))
+            labels = _labels(pairs)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(pairs, le=_le(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Labelled monotonically increasing counter"""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(zip(self.labels, label_values))} {value}")
+        return lines
+
+
+request_duration = Histogram("http_request_duration_seconds", "Time to produce a response", ("route", "method"))
+request_sql_time = Histogram("http_request_sql_seconds", "SQL time spent per request", ("route",))
+request_upstream_time = Histogram("http_request_upstream_seconds", "CryptoAPI time spent per request", ("route",))
+request_render_time = Histogram("http_request_render_seconds", "Template rendering time per request", ("route",))
+request_queries = Histogram("http_request_queries", "SQL statements executed per request", ("route",),
+                            buckets=QUERY_COUNT_BUCKETS)
+requests_total = Counter("http_requests_total", "Responses by route and status", ("route", "method", "status"))
+sql_duration = Histogram("sql_query_duration_seconds", "SQL statement latency", ("operation",))
+crypto_api_duration = Histogram("crypto_api_call_duration_seconds", "CryptoAPI call latency", ("call",))
+profiles_total = Counter("slow_request_profiles_total", "Profiler dumps written for slow requests", ("route",))
+
+METRICS = [
+    request_duration, request_sql_time, request_upstream_time, request_render_time,
+    request_queries, requests_total, sql_duration, crypto_api_duration, profiles_total
+]
+
+# Callables returning extra exposition lines (component stats), appended to /metrics
+collectors = []
+
+_profile_lock = threading.Lock()
+
+
+def _labels(pairs, **extra):
+    items = list(pairs) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _le(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _route():
+    # The URL rule, not the path, so /api/historical-data/<coin_id> is one series
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def timed(call):
+    """Decorator recording a CryptoAPI call's latency, charged to the current request"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                crypto_api_duration.observe(elapsed, call)
+                if has_request_context() and "metrics_started" in g:
+                    g.metrics_upstream += elapsed
+        return wrapper
+    return decorator
+
+
+# ----------------------
+# Flask hooks
+# ----------------------
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql_time = 0.0
+    g.metrics_queries = 0
+    g.metrics_upstream = 0.0
+    g.metrics_render = 0.0
+    g.metrics_profiler = None
+
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active per interpreter (3.12+); skip this sample
+            return
+        g.metrics_profiler = profiler
+
+
+def _after_request(response):
+    if "metrics_started" not in g:
+        return response
+
+    elapsed = time.perf_counter() - g.metrics_started
+    route = _route()
+    request_duration.observe(elapsed, route, request.method)
+    request_sql_time.observe(g.metrics_sql_time, route)
+    request_upstream_time.observe(g.metrics_upstream, route)
+    request_render_time.observe(g.metrics_render, route)
+    request_queries.observe(g.metrics_queries, route)
+    requests_total.inc(route, request.method, response.status_code)
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        logging.warning(
+            f"Slow request {request.method} {route}: {elapsed * 1000:.0f}ms "
+            f"(sql {g.metrics_sql_time * 1000:.0f}ms over {g.metrics_queries} queries, "
+            f"upstream {g.metrics_upstream * 1000:.0f}ms, render {g.metrics_render * 1000:.0f}ms)"
+        )
+
+    profiler = g.pop("metrics_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            _dump_profile(profiler, route, elapsed)
+
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped on unhandled errors; never leave a profiler running
+    profiler = g.pop("metrics_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def _dump_profile(profiler, route, elapsed):
+    name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{name}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof")
+    try:
+        with _profile_lock:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(path)
+        profiles_total.inc(route)
+        logging.info(f"Wrote profile for slow request {route} to {path}")
+    except OSError as e:
+        logging.error(f"Could not write profile {path}: {e}")
+
+
+def _before_render(sender, template, context, **extra):
+    if "metrics_started" not in g:
+        return
+    # Partials (price_fragment) render inside a page; only time the outermost template
+    depth = g.get("metrics_render_depth", 0)
+    if depth == 0:
+        g.metrics_render_started = time.perf_counter()
+    g.metrics_render_depth = depth + 1
+
+
+def _rendered(sender, template, context, **extra):
+    depth = g.get("metrics_render_depth", 0)
+    if depth == 0:
+        return
+    g.metrics_render_depth = depth - 1
+    if depth == 1:
+        g.metrics_render += time.perf_counter() - g.metrics_render_started
+
+
+# ----------------------
+# SQLAlchemy hooks
+# ----------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    sql_duration.observe(elapsed, (statement.split(None, 1) or ["OTHER"])[0].upper())
+    if has_request_context() and "metrics_started" in g:
+        g.metrics_sql_time += elapsed
+        g.metrics_queries += 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute never runs for a failed statement; drop its start time
+    # so the pooled connection doesn't carry it into later queries
+    if context.connection is not None and context.connection.info.get("metrics_query_start"):
+        context.connection.info["metrics_query_start"].pop()
+
+
+# ----------------------
+# Exposition
+# ----------------------
+def render():
+    """Prometheus text exposition for this worker process"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collector in collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logging.error(f"Metrics collector {collector.__name__} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def stats_lines(prefix, stats, labels=None):
+    """Numeric entries of a component stats() dict as gauge lines"""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"{prefix}_{key}{_labels((labels or {}).items())} {value}")
+    return lines
+
+
+def _hit_ratio(stats):
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    return stats.get("hits", 0) / lookups if lookups else 0
+
+
+def _component_stats():
+    # Imported lazily: both modules import app, which imports this module
+    import fragment_cache
+    import user_cache
+    from crypto_api import crypto_api
+
+    lines = []
+
+    price_cache = crypto_api.price_cache.stats()
+    lines += stats_lines("price_cache", price_cache)
+    lines.append(f"price_cache_hit_ratio {_hit_ratio(price_cache)}")
+
+    users = user_cache.stats()
+    lines += stats_lines("user_cache", users)
+    lines.append(f"user_cache_hit_ratio {_hit_ratio(users)}")
+
+    fragments = fragment_cache.stats()
+    lines += stats_lines("fragment_cache", fragments)
+    lines.append(f"fragment_cache_hit_ratio {_hit_ratio(fragments)}")
+
+    upstream = crypto_api.client.stats()
+    lines += stats_lines("upstream", {k: v for k, v in upstream.items() if k != "latency_sum"})
+    lines.append(f'upstream_circuit_open {int(upstream["circuit"] != "closed")}')
+    lines.append("# TYPE upstream_request_duration_seconds histogram")
+    cumulative = 0
+    for bound, count in upstream["latency_buckets"]:
+        cumulative += count
+        lines.append(f"upstream_request_duration_seconds_bucket{_labels([], le=_le(bound))} {cumulative}")
+    lines.append(f"upstream_request_duration_seconds_sum {upstream['latency_sum']}")
+    lines.append(f"upstream_request_duration_seconds_count {upstream['calls']}")
+
+    for provider, counts in crypto_api.aggregator.stats().items():
+        for outcome, count in counts.items():
+            lines.append(f"price_provider_fetches_total{_labels({'provider': provider, 'outcome': outcome}.items())} {count}")
+
+    return lines
+
+
+collectors.append(_component_stats)
+
+
+def authorized(req):
+    """True when /metrics may be served for this request"""
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest(req.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
@@ -1,8 +1,9 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password, needs_rehash
 from app import db
+from money import ExactDecimal, FixedPoint
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -22,36 +23,36 @@ class User(UserMixin, db.Model):
     kyc_documents = db.relationship('KYCDocument', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
     
-    def get_portfolio_value(self):
-        total_value = 0.0
-        if hasattr(self, 'wallets') and self.wallets:
-            for wallet in self.wallets:
-                if wallet.balance:
-                    total_value += wallet.balance * wallet.get_current_price()
-        return total_value
+    def get_portfolio_value(self, prices=None):
+        """Total INR value of the user's wallets; see portfolio.Portfolio"""
+        from crypto_api import crypto_api
+        from portfolio import Portfolio
+        return Portfolio(self.wallets, prices or crypto_api.get_crypto_prices()).total_inr
 
 class Wallet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     currency = db.Column(db.String(10), nullable=False)  # BTC, ETH, USDT, INR, USD
-    balance = db.Column(db.Float, default=0.0)
+    balance = db.Column(FixedPoint(), default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'currency', name='uq_wallet_user_currency'),
+    )
     
-    def get_current_price(self):
-        # Mock prices for demonstration - in production would use real API
-        prices = {
-            'BTC': 45000.00,
-            'ETH': 3200.00,
-            'USDT': 1.00,
-            'INR': 1.00,
-            'USD': 83.12  # USD to INR rate
-        }
-        return prices.get(self.currency, 1.0)
+    def get_current_price(self, prices=None):
+        """USD price of one unit of this wallet's currency"""
+        from crypto_api import crypto_api
+        from portfolio import usd_prices
+        return usd_prices(prices or crypto_api.get_crypto_prices()).get(self.currency, 0)
 
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,14 +60,33 @@ class Transaction(db.Model):
     transaction_type = db.Column(db.String(20), nullable=False)  # buy, sell, send, receive, convert
     from_currency = db.Column(db.String(10))
     to_currency = db.Column(db.String(10))
-    amount = db.Column(db.Float, nullable=False)
-    rate = db.Column(db.Float)
-    fee = db.Column(db.Float, default=0.0)
+    amount = db.Column(FixedPoint(), nullable=False)
+    rate = db.Column(ExactDecimal())
+    fee = db.Column(FixedPoint(), default=0)
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed
     recipient_address = db.Column(db.String(100))
+    idempotency_key = db.Column(db.String(80))  # makes form resubmits safe; unique per user
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index('ix_transaction_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_transaction_user_type_created_at', 'user_id', 'transaction_type', 'created_at'),
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_transaction_user_idempotency_key'),
+    )
+
+class PortfolioSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    value_usd = db.Column(db.Float, nullable=False)
+    value_inr = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_portfolio_snapshot_user_computed_at', 'user_id', 'computed_at'),
+        db.Index('ix_portfolio_snapshot_computed_at', 'computed_at'),  # retention sweeps
+    )
+
 class KYCDocument(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -76,6 +96,10 @@ class KYCDocument(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     verified_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index('ix_kyc_document_user_uploaded_at', 'user_id', 'uploaded_at'),
+    )
+
 class CryptoPrice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     symbol = db.Column(db.String(10), unique=True, nullable=False)
@@ -85,3 +109,31 @@ class CryptoPrice(db.Model):
     market_cap = db.Column(db.Float)
     volume_24h = db.Column(db.Float)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PriceTick(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    price_usd = db.Column(db.Float, nullable=False)
+    market_cap = db.Column(db.Float)
+    volume_24h = db.Column(db.Float)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_price_tick_symbol_recorded_at', 'symbol', 'recorded_at'),
+    )
+
+class PriceCandle(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    resolution = db.Column(db.String(4), nullable=False)  # 1m, 5m, 1h, 1d
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    market_cap = db.Column(db.Float)
+    volume_24h = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('symbol', 'resolution', 'bucket_start', name='uq_price_candle_bucket'),
+    )
@@ -0,0 +1,80 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from sqlalchemy import types
+
+# Amounts are stored as integer minor units: 10**-8 of a coin (one satoshi)
+# for every currency, so balances and volumes SUM as exact integers.
+SCALE = 8
+UNIT = 10 ** SCALE
+
+# Exchange rates span many orders of magnitude (INR->BTC ~ 2e-7, BTC->INR ~ 5e6).
+# No BIGINT scale keeps enough digits at both ends, so rates are exact decimals.
+RATE_PRECISION = 36
+RATE_SCALE = 18
+
+
+def to_decimal(value, scale=SCALE):
+    """Coerce a float, int, str or Decimal into a Decimal with `scale` places"""
+    if value is None:
+        value = 0
+    if isinstance(value, float):
+        value = repr(value)  # shortest round-tripping form, avoids binary noise
+    return Decimal(value).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_EVEN)
+
+
+def to_units(value, scale=SCALE):
+    """Integer minor units for an amount"""
+    return int(to_decimal(value, scale).scaleb(scale))
+
+
+def from_units(units, scale=SCALE):
+    """Decimal amount for integer minor units"""
+    return Decimal(int(units)).scaleb(-scale)
+
+
+class FixedPoint(types.TypeDecorator):
+    """Decimal amount stored as a BIGINT count of 10**-scale minor units"""
+
+    impl = types.BigInteger
+    cache_ok = True
+
+    def __init__(self, scale=SCALE):
+        super().__init__()
+        self.scale = scale
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_units(value, self.scale)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return from_units(value, self.scale)
+
+
+class ExactDecimal(types.TypeDecorator):
+    """Decimal stored as NUMERIC, or as text on SQLite, which keeps NUMERIC as a float"""
+
+    impl = types.Numeric
+    cache_ok = True
+
+    def __init__(self, precision=RATE_PRECISION, scale=RATE_SCALE):
+        super().__init__(precision, scale)
+        self.scale = scale
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(types.String(self.impl.precision + 2))
+        return dialect.type_descriptor(self.impl)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        value = to_decimal(value, self.scale)
+        return format(value, "f") if dialect.name == "sqlite" else value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return to_decimal(value, self.scale)
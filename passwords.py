@@ -0,0 +1,79 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+# Processes per web worker doing hash work; 0 hashes inline on the request thread
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 30))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class PasswordHashBusy(Exception):
+    """The hash pool didn't finish within PASSWORD_HASH_TIMEOUT"""
+
+
+def _executor():
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        # A pool inherited across a gunicorn fork is unusable; build one per process
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(fn, *args):
+    global _pool
+
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+
+    future = _executor().submit(fn, *args)
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()  # drop it if still queued behind the backlog
+        raise PasswordHashBusy(f"Password hashing took longer than {PASSWORD_HASH_TIMEOUT}s")
+    except BrokenProcessPool as e:
+        logging.error(f"Password hash pool broke, hashing inline: {e}")
+        with _pool_lock:
+            _pool = None
+        return fn(*args)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def _method_prefix(method):
+    """The method string werkzeug writes before the first "$", with its defaults filled in"""
+    # Mirrors werkzeug.security._hash_internal, so nothing is hashed just to learn it
+    name, *args = method.split(":")
+    if name == "scrypt":
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    return method
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with different method or cost parameters"""
+    return password_hash.split("$", 1)[0] != _method_prefix(PASSWORD_HASH_METHOD)
@@ -0,0 +1,54 @@
+from collections import namedtuple
+
+from crypto_api import CryptoAPI
+from models import Wallet
+
+# Used only when the price snapshot carries no INR quotes
+FALLBACK_USD_INR = 83.12
+
+WalletValue = namedtuple("WalletValue", ["wallet", "price_usd", "value_usd", "value_inr"])
+
+
+def usd_inr_rate(prices):
+    """Live USD->INR rate implied by the snapshot's dual-currency quotes"""
+    for coin_id in ("tether", *prices):
+        coin_data = prices.get(coin_id) or {}
+        if coin_data.get("usd") and coin_data.get("inr"):
+            return coin_data["inr"] / coin_data["usd"]
+    return FALLBACK_USD_INR
+
+
+def usd_prices(prices):
+    """Map every wallet currency to its USD price in the snapshot"""
+    rates = {"USD": 1.0, "INR": 1.0 / usd_inr_rate(prices)}
+    for coin_id, symbol in CryptoAPI.SYMBOLS.items():
+        rates[symbol] = (prices.get(coin_id) or {}).get("usd", 0) or 0
+    return rates
+
+
+class Portfolio:
+    """A user's wallets valued against a single price snapshot"""
+
+    def __init__(self, wallets, prices):
+        self.wallets = wallets
+        self.usd_inr = usd_inr_rate(prices)
+
+        rates = usd_prices(prices)
+        self.values = {}
+        self.total_usd = 0.0
+        for wallet in wallets:
+            price_usd = rates.get(wallet.currency, 0)
+            value_usd = float(wallet.balance or 0) * price_usd
+            self.values[wallet.id] = WalletValue(wallet, price_usd, value_usd, value_usd * self.usd_inr)
+            self.total_usd += value_usd
+
+        self.total_inr = self.total_usd * self.usd_inr
+
+    def value_of(self, wallet):
+        return self.values[wallet.id]
+
+
+def value_portfolio(user_id, prices):
+    """Load a user's wallets in one query and value them against prices"""
+    wallets = Wallet.query.filter_by(user_id=user_id).order_by(Wallet.id).all()
+    return Portfolio(wallets, prices)
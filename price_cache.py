@@ -0,0 +1,226 @@
+import os
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class PriceCache(ABC):
+    """Base class for price snapshot caches.
+
+    Backends implement a Redis-like interface: ``get``, ``set`` with a TTL,
+    ``add`` (set-if-absent, like ``SET NX``) and ``delete``. On top of that the
+    base class provides single-flight ``get_or_fetch`` so concurrent misses,
+    across threads and processes, collapse into one upstream fetch.
+    """
+
+    # Whether other processes see what this process writes
+    shared = True
+
+    def __init__(self, lock_ttl=15, wait_timeout=12, poll_interval=0.05):
+        # lock_ttl outlives the upstream timeout so a crashed fetcher can't wedge others
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced_waits = 0
+
+        self._fetch_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, key):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        ...
+
+    @abstractmethod
+    def add(self, key, value, ttl):
+        ...
+
+    @abstractmethod
+    def delete(self, key):
+        ...
+
+    def get_or_fetch(self, key, fetch, ttl):
+        """Return the cached value for key, calling fetch() at most once per miss"""
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+
+        # Threads in this process queue here; only the first goes upstream
+        with self._fetch_lock:
+            value = self.get(key)
+            if value is not None:
+                self._count("coalesced_waits")
+                return value
+
+            lock_key = f"{key}:lock"
+            if self.add(lock_key, os.getpid(), self.lock_ttl):
+                try:
+                    value = fetch()
+                    if value is not None:
+                        self.set(key, value, ttl)
+                    return value
+                finally:
+                    self.delete(lock_key)
+
+            # Another process holds the fetch lock; wait for its result
+            self._count("coalesced_waits")
+            deadline = time.time() + self.wait_timeout
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                value = self.get(key)
+                if value is not None:
+                    return value
+
+            return None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced_waits": self.coalesced_waits
+            }
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class MemoryPriceCache(PriceCache):
+    """Per-process cache; the default when no shared backend is configured"""
+
+    shared = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.time():
+                return False
+            self._data[key] = (value, time.time() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLitePriceCache(PriceCache):
+    """Cache stored in a SQLite file shared by every worker on one box"""
+
+    def __init__(self, path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path or os.path.join(tempfile.gettempdir(), "crypto_fintech_cache.db")
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS price_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM price_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        self._connect().execute(
+            "INSERT INTO price_cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO price_cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE price_cache.expires_at <= ?",
+            (key, json.dumps(value), now + ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM price_cache WHERE key = ?", (key,))
+
+
+class RedisPriceCache(PriceCache):
+    """Cache stored in Redis, for deployments spanning several machines"""
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        import redis  # optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value), px=int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(key, json.dumps(value), px=int(ttl * 1000), nx=True))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+def create_price_cache(url=None):
+    """Build a cache backend from a URL: memory://, sqlite:///path or redis://host"""
+    url = url or "memory://"
+    try:
+        if url.startswith("sqlite://"):
+            return SQLitePriceCache(url[len("sqlite:///"):] or None)
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RedisPriceCache(url)
+        return MemoryPriceCache()
+    except Exception as e:
+        logging.error(f"Error creating price cache for {url}, using memory cache: {e}")
+        return MemoryPriceCache()
@@ -0,0 +1,160 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert as generic_insert
+
+from app import db
+from models import PriceTick, PriceCandle
+from retention import PruneSchedule
+
+# Candle resolutions and their bucket width in seconds
+RESOLUTIONS = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400
+}
+
+# How long raw ticks and each candle resolution are kept (None = forever)
+RETENTION = {
+    "tick": timedelta(days=1),
+    "1m": timedelta(days=1),
+    "5m": timedelta(days=2),
+    "1h": timedelta(days=91),
+    "1d": None
+}
+
+
+def record_snapshot(data, symbols, recorded_at=None):
+    """Append a tick per coin and roll it into the OHLC candles"""
+    try:
+        recorded_at = recorded_at or datetime.utcnow()
+        ticks = [
+            {
+                "symbol": symbols[coin_id],
+                "price_usd": coin_data["usd"],
+                "market_cap": coin_data.get("usd_market_cap"),
+                "volume_24h": coin_data.get("usd_24h_vol"),
+                "recorded_at": recorded_at
+            }
+            for coin_id, coin_data in data.items()
+            if coin_id in symbols and coin_data.get("usd") is not None
+        ]
+        if not ticks:
+            return
+
+        db.session.execute(generic_insert(PriceTick), ticks)
+        _upsert_candles(ticks)
+        db.session.commit()
+
+        _prune_schedule.run_if_due()
+
+    except Exception as e:
+        logging.error(f"Error recording price history: {e}")
+        db.session.rollback()
+
+
+def _upsert_candles(ticks):
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        greatest, least = func.greatest, func.least
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        greatest, least = func.max, func.min
+    else:
+        logging.warning(f"Price candles are not supported on {dialect}")
+        return
+
+    rows = []
+    for tick in ticks:
+        epoch = tick["recorded_at"].replace(tzinfo=timezone.utc).timestamp()
+        for resolution, seconds in RESOLUTIONS.items():
+            rows.append({
+                "symbol": tick["symbol"],
+                "resolution": resolution,
+                "bucket_start": datetime.utcfromtimestamp(epoch - epoch % seconds),
+                "open": tick["price_usd"],
+                "high": tick["price_usd"],
+                "low": tick["price_usd"],
+                "close": tick["price_usd"],
+                "market_cap": tick["market_cap"],
+                "volume_24h": tick["volume_24h"]
+            })
+
+    stmt = insert(PriceCandle).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PriceCandle.symbol, PriceCandle.resolution, PriceCandle.bucket_start],
+        set_={
+            "high": greatest(PriceCandle.high, stmt.excluded.high),
+            "low": least(PriceCandle.low, stmt.excluded.low),
+            "close": stmt.excluded.close,
+            "market_cap": stmt.excluded.market_cap,
+            "volume_24h": stmt.excluded.volume_24h
+        }
+    )
+    db.session.execute(stmt)
+
+
+def prune_history():
+    """Delete ticks and candles older than their retention window"""
+    now = datetime.utcnow()
+    try:
+        PriceTick.query.filter(PriceTick.recorded_at < now - RETENTION["tick"])\
+            .delete(synchronize_session=False)
+
+        for resolution in RESOLUTIONS:
+            retention = RETENTION[resolution]
+            if retention is None:
+                continue
+            PriceCandle.query.filter(
+                PriceCandle.resolution == resolution,
+                PriceCandle.bucket_start < now - retention
+            ).delete(synchronize_session=False)
+
+        db.session.commit()
+
+    except Exception as e:
+        logging.error(f"Error pruning price history: {e}")
+        db.session.rollback()
+
+
+_prune_schedule = PruneSchedule(prune_history)
+
+
+def resolution_for_days(days):
+    """Pick the candle resolution CoinGecko would use for the window"""
+    if days <= 1:
+        return "5m"
+    if days <= 90:
+        return "1h"
+    return "1d"
+
+
+def get_chart(symbol, days):
+    """Return market_chart-shaped data from local candles, or None if not covered"""
+    try:
+        resolution = resolution_for_days(days)
+        since = datetime.utcnow() - timedelta(days=days)
+
+        candles = PriceCandle.query.filter(
+            PriceCandle.symbol == symbol,
+            PriceCandle.resolution == resolution,
+            PriceCandle.bucket_start >= since - timedelta(seconds=RESOLUTIONS[resolution])
+        ).order_by(PriceCandle.bucket_start).all()
+
+        # Only serve windows we have actually been recording for
+        if not candles or candles[0].bucket_start > since:
+            return None
+
+        points = [(int(c.bucket_start.replace(tzinfo=timezone.utc).timestamp() * 1000), c) for c in candles]
+        return {
+            "prices": [[ms, c.close] for ms, c in points],
+            "market_caps": [[ms, c.market_cap] for ms, c in points],
+            "total_volumes": [[ms, c.volume_24h] for ms, c in points]
+        }
+
+    except Exception as e:
+        logging.error(f"Error reading price history: {e}")
+        db.session.rollback()
+        return None
@@ -0,0 +1,138 @@
+import logging
+import statistics
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from http_client import CircuitOpenError
+
+# Fields of a simple/price quote that get aggregated across providers
+QUOTE_FIELDS = ("usd", "inr", "usd_24h_change", "usd_market_cap", "usd_24h_vol")
+PRICE_FIELDS = ("usd", "inr")
+
+
+class PriceProvider(ABC):
+    """A source of CoinGecko simple/price-shaped quotes for a list of coin ids"""
+
+    def __init__(self, name, budget=5.0):
+        self.name = name
+        # Seconds after which this provider's answer is ignored for the tick
+        self.budget = budget
+
+    @abstractmethod
+    def fetch(self, coin_ids):
+        ...
+
+
+class CoinGeckoProvider(PriceProvider):
+    """CoinGecko, or any server speaking its /simple/price API"""
+
+    # CoinGecko rejects overly long id lists, so large universes are split
+    BATCH_SIZE = 250
+
+    def __init__(self, name, client, budget=5.0):
+        super().__init__(name, budget)
+        self.client = client
+
+    def fetch(self, coin_ids):
+        data = {}
+        for start in range(0, len(coin_ids), self.BATCH_SIZE):
+            data.update(self.client.get_json("/simple/price", params={
+                "ids": ",".join(coin_ids[start:start + self.BATCH_SIZE]),
+                "vs_currencies": "usd,inr",
+                "include_24hr_change": "true",
+                "include_market_cap": "true",
+                "include_24hr_vol": "true"
+            }))
+        return data
+
+
+class StaticProvider(PriceProvider):
+    """Fixed quotes after an optional delay; a local stub for testing"""
+
+    def __init__(self, name, quotes, delay=0, budget=5.0):
+        super().__init__(name, budget)
+        self.quotes = quotes
+        self.delay = delay
+
+    def fetch(self, coin_ids):
+        if self.delay:
+            time.sleep(self.delay)
+        return {coin_id: self.quotes[coin_id] for coin_id in coin_ids if coin_id in self.quotes}
+
+
+class PriceAggregator:
+    """Query every provider concurrently and merge the answers that arrive in budget"""
+
+    def __init__(self, providers, method="median"):
+        self.providers = providers
+        self.method = method
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(providers)), thread_name_prefix="price-provider")
+        self._stats_lock = threading.Lock()
+        self._stats = {p.name: {"ok": 0, "errors": 0, "dropped": 0} for p in providers}
+
+    def fetch(self, coin_ids):
+        futures = {self._pool.submit(self._timed_fetch, p, coin_ids): p for p in self.providers}
+        done, _ = wait(futures, timeout=max(p.budget for p in self.providers))
+
+        responses = []
+        for future, provider in futures.items():
+            if future not in done:
+                self._count(provider, "dropped")
+                continue
+            try:
+                elapsed, data = future.result()
+            except CircuitOpenError:
+                # Upstream known to be down; the breaker already logged why
+                self._count(provider, "errors")
+                continue
+            except Exception as e:
+                logging.error(f"Price provider {provider.name} failed: {e}")
+                self._count(provider, "errors")
+                continue
+            if elapsed > provider.budget:
+                self._count(provider, "dropped")
+                continue
+            self._count(provider, "ok")
+            responses.append(data)
+
+        return aggregate(responses, coin_ids, self.method)
+
+    def stats(self):
+        with self._stats_lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def _timed_fetch(self, provider, coin_ids):
+        started = time.perf_counter()
+        data = provider.fetch(coin_ids)
+        return time.perf_counter() - started, data
+
+    def _count(self, provider, outcome):
+        with self._stats_lock:
+            self._stats[provider.name][outcome] += 1
+
+
+def aggregate(responses, coin_ids, method="median"):
+    """Merge provider quotes per coin: median, or volume-weighted prices with method="vwap" """
+    snapshot = {}
+    for coin_id in coin_ids:
+        quotes = [r[coin_id] for r in responses if (r.get(coin_id) or {}).get("usd") is not None]
+        if not quotes:
+            continue
+
+        merged = {}
+        for field in QUOTE_FIELDS:
+            values = [q[field] for q in quotes if q.get(field) is not None]
+            if not values:
+                continue
+            merged[field] = statistics.median(values)
+
+            if method == "vwap" and field in PRICE_FIELDS:
+                weighted = [(q[field], q.get("usd_24h_vol") or 0) for q in quotes if q.get(field) is not None]
+                total_volume = sum(w for _, w in weighted)
+                if total_volume > 0:
+                    merged[field] = sum(v * w for v, w in weighted) / total_volume
+
+        snapshot[coin_id] = merged
+    return snapshot
@@ -0,0 +1,156 @@
+import os
+import logging
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import db
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes
+    fcntl = None
+
+# Arbitrary key shared by every worker competing for the Postgres advisory lock
+ADVISORY_LOCK_KEY = 727274001
+
+
+class PriceRefresher:
+    """Keep the CryptoAPI price snapshot warm from a background thread.
+
+    Only one process per deployment (the leader) calls CoinGecko. Leadership is
+    a Postgres advisory lock when the database is Postgres, otherwise an
+    exclusive file lock shared by the workers on this box. Followers adopt the
+    leader's snapshot from the shared price cache, or from the CryptoPrice
+    table when the cache is process-local.
+    """
+
+    def __init__(self, app, api, interval=None, follow_interval=None, lock_path=None):
+        self.app = app
+        self.api = api
+
+        # Refresh ahead of expiry so readers never see a stale snapshot
+        self.interval = interval or max(api.cache_ttl * 0.75, 1)
+        self.follow_interval = follow_interval or min(5, self.interval)
+
+        # Optionally revalue every portfolio after each leader refresh
+        self.revalue_portfolios = os.environ.get("PORTFOLIO_REVALUATION_ENABLED", "false").lower() == "true"
+        self.lock_path = lock_path or os.environ.get(
+            "PRICE_REFRESH_LOCK",
+            os.path.join(tempfile.gettempdir(), "crypto_fintech_prices.lock")
+        )
+
+        self.is_leader = False
+        self._lock_file = None
+        self._lock_conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._release_leadership()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.follow_interval
+            try:
+                with self.app.app_context():
+                    if self._acquire_leadership():
+                        started = time.time()
+                        prices = self.api.refresh_prices()
+                        if self.revalue_portfolios:
+                            from revaluation import revalue_all_portfolios
+                            revalue_all_portfolios(prices)
+                        wait = max(self.interval - (time.time() - started), 0.5)
+                    else:
+                        self.api.sync_snapshot()
+            except Exception as e:
+                logging.error(f"Price refresher error: {e}")
+            self._stop.wait(wait)
+
+    # ----------------------
+    # Leader election
+    # ----------------------
+    def _acquire_leadership(self):
+        if self.is_leader and self._leadership_alive():
+            return True
+
+        self._release_leadership()
+        if db.engine.dialect.name == "postgresql":
+            self.is_leader = self._acquire_advisory_lock()
+        else:
+            self.is_leader = self._acquire_file_lock()
+
+        if self.is_leader:
+            logging.info(f"Price refresher in pid {os.getpid()} is now the leader")
+        return self.is_leader
+
+    def _acquire_advisory_lock(self):
+        conn = db.engine.connect()
+        try:
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            ).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+
+        if not acquired:
+            conn.close()
+            return False
+
+        # The lock lives as long as this session, so keep the connection open
+        self._lock_conn = conn
+        return True
+
+    def _acquire_file_lock(self):
+        if fcntl is None:
+            return True
+
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        return True
+
+    def _leadership_alive(self):
+        if self._lock_conn is None:
+            return True
+        try:
+            self._lock_conn.execute(text("SELECT 1"))
+            self._lock_conn.commit()
+            return True
+        except Exception as e:
+            logging.warning(f"Lost price refresher leadership connection: {e}")
+            return False
+
+    def _release_leadership(self):
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()
+            except Exception:
+                pass
+            self._lock_conn = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
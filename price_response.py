@@ -0,0 +1,83 @@
+import gzip
+import json
+import threading
+import time
+from email.utils import formatdate
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# max-age for fallback prices, which have no real expiry
+FALLBACK_MAX_AGE = 5
+
+
+class EncodedSnapshot:
+    """A price snapshot serialized and compressed once, shared by every request"""
+
+    def __init__(self, prices, version):
+        self.prices = prices
+        self.version = version
+        self.tag = f"prices-{int(version * 1000)}" if version else "prices-fallback"
+
+        body = json.dumps(prices, separators=(",", ":")).encode()
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body)
+
+    def etag(self, encoding):
+        """Unquoted entity tag; each encoding is a different byte representation"""
+        return self.tag if encoding == "identity" else f"{self.tag}-{encoding}"
+
+    def pick_encoding(self, accept_encoding):
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding
+        return "identity"
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def encoded_snapshot(prices, version):
+    global _current
+
+    current = _current
+    if current is not None and current.prices is prices and current.version == version:
+        return current
+
+    with _lock:
+        if _current is None or _current.prices is not prices or _current.version != version:
+            _current = EncodedSnapshot(prices, version)
+        return _current
+
+
+def snapshot_response(request, prices, version, ttl):
+    """Conditional, cacheable JSON response for a price snapshot"""
+    snapshot = encoded_snapshot(prices, version)
+    max_age = max(0, int(version + ttl - time.time())) if version else FALLBACK_MAX_AGE
+
+    encoding = snapshot.pick_encoding(request.headers.get("Accept-Encoding", ""))
+    etag = snapshot.etag(encoding)
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding"
+    }
+    if version:
+        headers["Last-Modified"] = formatdate(version, usegmt=True)
+
+    # Parsed entity-tag list: handles "*", several tags, and W/ tags from proxies that re-compress
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    return Response(snapshot.bodies[encoding], mimetype="application/json", headers=headers)
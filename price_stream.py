@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+from collections import deque
+
+from crypto_api import CryptoAPI
+
+KEEPALIVE_SECONDS = 15
+HISTORY_FRAMES = 64
+
+# Open streams one worker will hold. Each holds a gthread thread (or a greenlet
+# under gevent) for as long as the client stays connected; gunicorn.conf.py
+# sets this per profile so streams can't take every thread from page requests.
+MAX_CLIENTS = int(os.environ.get("PRICE_STREAM_MAX_CLIENTS", 10))
+
+
+class PriceBroadcaster:
+    """Fan price snapshots out to Server-Sent Events clients.
+
+    Each new snapshot is diffed against the previous one and serialized once
+    into an SSE frame shared by every subscriber. Clients only track the last
+    sequence number they sent, so per-connection state is a single integer.
+    """
+
+    def __init__(self, keepalive=KEEPALIVE_SECONDS, history=HISTORY_FRAMES, max_clients=MAX_CLIENTS):
+        self.keepalive = keepalive
+        self.max_clients = max_clients
+        self.clients = 0
+
+        self._cond = threading.Condition()
+        self._frames = deque(maxlen=history)  # (seq, delta frame)
+        self._seq = 0
+        self._snapshot = {}
+        self._snapshot_frame = None
+
+    def publish(self, snapshot, version):
+        """Record a snapshot; wakes subscribers only if some field changed"""
+        with self._cond:
+            delta = {}
+            for coin_id, fields in snapshot.items():
+                previous = self._snapshot.get(coin_id, {})
+                changed = {k: v for k, v in fields.items() if previous.get(k) != v}
+                if changed:
+                    delta[coin_id] = changed
+            if not delta:
+                return
+
+            self._seq += 1
+            self._snapshot = {coin_id: dict(fields) for coin_id, fields in snapshot.items()}
+            self._frames.append((self._seq, self._frame("delta", {"version": version, "prices": delta})))
+            self._snapshot_frame = self._frame("snapshot", {"version": version, "prices": self._snapshot})
+            self._cond.notify_all()
+
+    def acquire(self):
+        """Claim a client slot; False when max_clients streams are already open"""
+        with self._cond:
+            if self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.clients -= 1
+
+    def stream(self):
+        """Generator of SSE frames for one client: full snapshot, then deltas"""
+        with self._cond:
+            seq = self._seq
+            first = self._snapshot_frame
+
+        if first:
+            yield first
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > seq, timeout=self.keepalive)
+                if self._seq == seq:
+                    frames = None
+                elif self._frames and self._frames[0][0] <= seq + 1:
+                    frames = [frame for s, frame in self._frames if s > seq]
+                else:
+                    # Fell behind the retained deltas; resynchronise with a full snapshot
+                    frames = [self._snapshot_frame]
+                seq = self._seq
+
+            if frames is None:
+                yield b": keepalive\n\n"
+            else:
+                yield b"".join(frames)
+
+    def _frame(self, event, payload):
+        return f"id: {self._seq}\nevent: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+
+price_broadcaster = PriceBroadcaster()
+CryptoAPI.snapshot_listeners.append(price_broadcaster.publish)
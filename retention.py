@@ -0,0 +1,22 @@
+import threading
+import time
+
+PRUNE_INTERVAL = 3600  # seconds between retention sweeps per process
+
+
+class PruneSchedule:
+    """Run a retention sweep at most once per interval in this process"""
+
+    def __init__(self, prune, interval=PRUNE_INTERVAL):
+        self.prune = prune
+        self.interval = interval
+        self.last_run = 0
+        self._lock = threading.Lock()
+
+    def run_if_due(self):
+        with self._lock:
+            now = time.time()
+            if now - self.last_run < self.interval:
+                return
+            self.last_run = now
+        self.prune()
@@ -0,0 +1,92 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import BigInteger, case, insert, select, type_coerce
+
+from app import db
+from models import Wallet, PortfolioSnapshot
+from money import UNIT
+from portfolio import usd_inr_rate, usd_prices
+from retention import PruneSchedule
+
+CHUNK_SIZE = 50000
+
+# Snapshots older than this are deleted; the refresher can revalue every ~45s
+SNAPSHOT_RETENTION = timedelta(hours=float(os.environ.get("PORTFOLIO_SNAPSHOT_RETENTION_HOURS", 24)))
+
+
+def revalue_all_portfolios(prices, chunk_size=CHUNK_SIZE, computed_at=None):
+    """Value every wallet in the system and store one PortfolioSnapshot per user.
+
+    Wallet rows are streamed with a server-side cursor in chunks of
+    (user_id, currency_index, balance), valued against a price vector and
+    summed per user with bincount. Returns the number of snapshots written.
+    """
+    computed_at = computed_at or datetime.utcnow()
+    rates = usd_prices(prices)
+    currencies = list(rates)
+
+    # Balances arrive as integer minor units; unknown currencies map to a trailing zero price
+    price_vector = np.array([rates[c] for c in currencies] + [0.0], dtype=np.float64) / UNIT
+    currency_index = case(
+        {currency: i for i, currency in enumerate(currencies)},
+        value=Wallet.currency,
+        else_=len(currencies)
+    )
+
+    totals = np.zeros(0, dtype=np.float64)
+    seen = np.zeros(0, dtype=bool)
+
+    query = select(Wallet.user_id, currency_index, type_coerce(Wallet.balance, BigInteger))\
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    result = db.session.execute(query)
+
+    for partition in result.partitions(chunk_size):
+        rows = np.array([tuple(row) for row in partition], dtype=np.float64)
+        user_ids = rows[:, 0].astype(np.int64)
+        values = np.nan_to_num(rows[:, 2]) * price_vector[rows[:, 1].astype(np.int64)]
+
+        chunk_totals = np.bincount(user_ids, weights=values)
+        if len(chunk_totals) > len(totals):
+            totals = np.pad(totals, (0, len(chunk_totals) - len(totals)))
+            seen = np.pad(seen, (0, len(chunk_totals) - len(seen)))
+        totals[:len(chunk_totals)] += chunk_totals
+        seen[user_ids] = True
+
+    user_ids = np.flatnonzero(seen)
+    totals_usd = totals[user_ids]
+    totals_inr = totals_usd * usd_inr_rate(prices)
+
+    try:
+        for start in range(0, len(user_ids), chunk_size):
+            end = start + chunk_size
+            db.session.execute(insert(PortfolioSnapshot), [
+                {"user_id": int(u), "value_usd": float(usd), "value_inr": float(inr), "computed_at": computed_at}
+                for u, usd, inr in zip(user_ids[start:end], totals_usd[start:end], totals_inr[start:end])
+            ])
+        db.session.commit()
+
+    except Exception as e:
+        logging.error(f"Error writing portfolio snapshots: {e}")
+        db.session.rollback()
+        return 0
+
+    _prune_schedule.run_if_due()
+    return len(user_ids)
+
+
+def prune_snapshots():
+    """Delete portfolio snapshots older than SNAPSHOT_RETENTION"""
+    try:
+        PortfolioSnapshot.query.filter(PortfolioSnapshot.computed_at < datetime.utcnow() - SNAPSHOT_RETENTION)\
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+    except Exception as e:
+        logging.error(f"Error pruning portfolio snapshots: {e}")
+        db.session.rollback()
+
+
+_prune_schedule = PruneSchedule(prune_snapshots)
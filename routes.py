@@ -1,20 +1,48 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
 import logging
+import uuid
 
-from app import app, db
-from models import User, Wallet, Transaction, KYCDocument
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import User, Wallet, KYCDocument
 from forms import RegistrationForm, LoginForm, KYCForm, TransactionForm, PaymentForm
 from crypto_api import crypto_api
+from portfolio import value_portfolio
+from money import to_decimal
+import ledger
+import transaction_history
+import user_cache
+from price_stream import price_broadcaster
+from price_response import snapshot_response
+import metrics
+import fragment_cache
+from db_routing import read_only
+from passwords import PasswordHashBusy
+from coins import COINS_BY_ID, COINS_BY_SYMBOL
+
+TRADE_FEE_RATE = Decimal('0.001')  # 0.1% fee
+PAYMENT_FEE_RATE = Decimal('0.005')  # 0.5% fee
+
+bp = Blueprint('main', __name__)
+
+# Price partials are rendered once per snapshot and shared by every request
+bp.add_app_template_global(fragment_cache.price_fragment, 'price_fragment')
+# Symbols and names come from the coin config rather than being hard-coded per template
+bp.add_app_template_global(COINS_BY_ID, 'coins')
+bp.add_app_template_global(COINS_BY_SYMBOL, 'coins_by_symbol')
 
 # ----------------------
 # Public Routes
 # ----------------------
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     # Get latest crypto prices (cached)
     try:
@@ -22,24 +50,30 @@ def index():
     except Exception as e:
         logging.error(f"Error loading index prices: {e}")
         prices = {}
-    
-    return render_template('index.html', prices=prices)
+
+    # Anonymous landing page is identical for every visitor until the next tick
+    return fragment_cache.cached_page(lambda: render_template('index.html', prices=prices), prices)
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     form = RegistrationForm()
     if form.validate_on_submit():
         try:
-            # Check duplicates
-            if User.query.filter_by(username=form.username.data).first():
+            # Check duplicates (one query for both; unique constraints catch races)
+            taken = User.query.with_entities(User.username, User.email).filter(
+                (User.username == form.username.data) |
+                (User.email == form.email.data)
+            ).all()
+
+            if any(row.username == form.username.data for row in taken):
                 flash('Username already exists. Please choose a different one.', 'danger')
                 return render_template('register.html', form=form)
 
-            if User.query.filter_by(email=form.email.data).first():
+            if taken:
                 flash('Email already registered. Please use a different email.', 'danger')
                 return render_template('register.html', form=form)
 
@@ -54,17 +88,28 @@ def register():
             user.set_password(form.password.data)
 
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()  # assigns user.id inside the same transaction
 
-            # Create default wallets
-            for currency in ['BTC', 'ETH', 'USDT', 'INR', 'USD']:
-                balance = 10000.0 if currency == 'INR' else 0.0
-                db.session.add(Wallet(user_id=user.id, currency=currency, balance=balance))
+            # Create default wallets in one bulk INSERT
+            db.session.execute(insert(Wallet), [
+                {'user_id': user.id, 'currency': currency, 'balance': balance}
+                for currency, balance in current_app.config['DEFAULT_WALLETS'].items()
+            ])
 
             db.session.commit()
 
             flash('Registration successful! Please log in.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
+
+        except IntegrityError:
+            db.session.rollback()
+            flash('Username or email already registered. Please choose different ones.', 'danger')
+
+        except PasswordHashBusy as e:
+            db.session.rollback()
+            logging.error(f"Registration error: {e}")
+            flash('We are busy right now. Please try again in a moment.', 'danger')
+            return render_template('register.html', form=form), 503
 
         except Exception as e:
             db.session.rollback()
@@ -74,10 +119,10 @@ def register():
     return render_template('register.html', form=form)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     form = LoginForm()
     if form.validate_on_submit():
@@ -87,32 +132,47 @@ def login():
             (User.email == form.username.data)
         ).first()
 
-        if user and user.check_password(form.password.data):
+        try:
+            password_ok = user is not None and user.check_password(form.password.data)
+        except PasswordHashBusy as e:
+            logging.error(f"Login error: {e}")
+            flash('We are busy right now. Please try again in a moment.', 'danger')
+            return render_template('login.html', form=form), 503
+
+        if password_ok:
+            if user.password_needs_rehash():
+                # Upgrade hashes made with older cost parameters while we have the password
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Password rehash error: {e}")
+
             login_user(user)
-            return redirect(request.args.get('next') or url_for('dashboard'))
+            return redirect(request.args.get('next') or url_for('main.dashboard'))
         else:
             flash('Invalid username/email or password.', 'danger')
 
     return render_template('login.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
 # ----------------------
 # Dashboard & Wallet
 # ----------------------
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
-    wallets = Wallet.query.filter_by(user_id=current_user.id).all()
-    recent_transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.created_at.desc()).limit(5).all()
+    recent_transactions = transaction_history.user_transactions(current_user.id).limit(5).all()
 
     try:
         prices = crypto_api.get_crypto_prices()
@@ -120,51 +180,40 @@ def dashboard():
         logging.error(f"Dashboard price error: {e}")
         prices = {}
 
-    portfolio_value = current_user.get_portfolio_value()
+    portfolio = value_portfolio(current_user.id, prices)
 
     return render_template('dashboard.html',
-                           wallets=wallets,
+                           wallets=portfolio.wallets,
+                           portfolio=portfolio,
                            transactions=recent_transactions,
                            prices=prices,
-                           portfolio_value=portfolio_value)
+                           portfolio_value=portfolio.total_inr)
 
 
-@app.route('/wallet')
+@bp.route('/wallet')
 @login_required
+@read_only
 def wallet():
-    wallets = Wallet.query.filter_by(user_id=current_user.id).all()
     try:
         prices = crypto_api.get_crypto_prices()
     except Exception as e:
         logging.error(f"Wallet price error: {e}")
         prices = {}
-    return render_template('wallet.html', wallets=wallets, prices=prices)
+
+    portfolio = value_portfolio(current_user.id, prices)
+    return render_template('wallet.html', wallets=portfolio.wallets, portfolio=portfolio, prices=prices)
 
 
 # ----------------------
 # Trading
 # ----------------------
-@app.route('/trading', methods=['GET', 'POST'])
+@bp.route('/trading', methods=['GET', 'POST'])
 @login_required
 def trading():
     form = TransactionForm()
 
     if form.validate_on_submit():
         try:
-            from_wallet = Wallet.query.filter_by(
-                user_id=current_user.id,
-                currency=form.from_currency.data
-            ).first()
-
-            to_wallet = Wallet.query.filter_by(
-                user_id=current_user.id,
-                currency=form.to_currency.data
-            ).first()
-
-            if not from_wallet or from_wallet.balance < form.amount.data:
-                flash('Insufficient balance in source wallet.', 'danger')
-                return render_template('trading.html', form=form)
-
             converted_amount = crypto_api.convert_currency(
                 form.amount.data,
                 form.from_currency.data,
@@ -175,144 +224,112 @@ def trading():
                 flash('Unable to process conversion. Please try again.', 'danger')
                 return render_template('trading.html', form=form)
 
-            fee = (form.amount.data or 0.0) * 0.001  # 0.1% fee
-            from_wallet.balance -= form.amount.data
-
-            if not to_wallet:
-                to_wallet = Wallet(user_id=current_user.id,
-                                   currency=form.to_currency.data,
-                                   balance=0.0)
-                db.session.add(to_wallet)
+            fee = to_decimal(form.amount.data * TRADE_FEE_RATE)
 
-            to_wallet.balance += converted_amount
-
-            transaction = Transaction(
+            ledger.execute_trade(
                 user_id=current_user.id,
                 transaction_type=form.transaction_type.data,
                 from_currency=form.from_currency.data,
                 to_currency=form.to_currency.data,
                 amount=form.amount.data,
-                rate=converted_amount / (form.amount.data or 1.0),
+                converted_amount=converted_amount,
                 fee=fee,
-                status='completed',
-                completed_at=datetime.utcnow()
+                idempotency_key=form.idempotency_key.data or None
             )
 
-            db.session.add(transaction)
-            db.session.commit()
-
             flash(f'Successfully converted {form.amount.data} {form.from_currency.data} '
                   f'to {converted_amount:.6f} {form.to_currency.data}', 'success')
-            return redirect(url_for('wallet'))
+            return redirect(url_for('main.wallet'))
+
+        except ledger.InsufficientFunds:
+            flash('Insufficient balance in source wallet.', 'danger')
+            return render_template('trading.html', form=form)
+
+        except ledger.IdempotencyConflict:
+            flash('This form was already submitted with different details. Please review and submit again.', 'warning')
+            form.idempotency_key.data = None
 
         except Exception as e:
             db.session.rollback()
             logging.error(f"Trading error: {e}")
             flash('Transaction failed. Please try again.', 'danger')
 
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = uuid.uuid4().hex
+
     try:
         prices = crypto_api.get_crypto_prices()
+        exchange_rates = crypto_api.get_conversion_matrix().as_dict()
     except Exception:
         prices = {}
-    return render_template('trading.html', form=form, prices=prices)
+        exchange_rates = {}
+    return render_template('trading.html', form=form, prices=prices, exchange_rates=exchange_rates)
 
 
 # ----------------------
 # Payments
 # ----------------------
-@app.route('/payments', methods=['GET', 'POST'])
+@bp.route('/payments', methods=['GET', 'POST'])
 @login_required
 def payments():
     form = PaymentForm()
 
     if form.validate_on_submit():
         try:
-            wallet = Wallet.query.filter_by(
-                user_id=current_user.id,
-                currency=form.currency.data
-            ).first()
-
-            if not wallet or wallet.balance < form.amount.data:
-                flash('Insufficient balance for this payment.', 'danger')
-                return render_template('payments.html', form=form)
-
             recipient = User.query.filter_by(email=form.recipient_email.data).first()
             if not recipient:
                 flash('Recipient email not found in our system.', 'danger')
-                return render_template('payments.html', form=form)
+                return render_template('payment.html', form=form)
 
             if recipient.id == current_user.id:
                 flash('Cannot send payment to yourself.', 'danger')
-                return render_template('payments.html', form=form)
-
-            fee = (form.amount.data or 0.0) * 0.005  # 0.5% fee
-            total_deduction = form.amount.data + fee
-
-            if wallet.balance < total_deduction:
-                flash(f'Insufficient balance. Need {total_deduction:.2f} including fees.', 'danger')
-                return render_template('payments.html', form=form)
+                return render_template('payment.html', form=form)
 
-            recipient_wallet = Wallet.query.filter_by(
-                user_id=recipient.id,
-                currency=form.currency.data
-            ).first()
+            fee = to_decimal(form.amount.data * PAYMENT_FEE_RATE)
 
-            if not recipient_wallet:
-                recipient_wallet = Wallet(user_id=recipient.id,
-                                          currency=form.currency.data,
-                                          balance=0.0)
-                db.session.add(recipient_wallet)
-
-            wallet.balance -= total_deduction
-            recipient_wallet.balance += form.amount.data
-
-            send_transaction = Transaction(
-                user_id=current_user.id,
-                transaction_type='send',
-                from_currency=form.currency.data,
-                to_currency=form.currency.data,
+            ledger.execute_payment(
+                sender_id=current_user.id,
+                recipient_id=recipient.id,
+                recipient_email=form.recipient_email.data,
+                currency=form.currency.data,
                 amount=form.amount.data,
                 fee=fee,
-                status='completed',
-                recipient_address=form.recipient_email.data,
-                completed_at=datetime.utcnow()
+                idempotency_key=form.idempotency_key.data or None
             )
 
-            receive_transaction = Transaction(
-                user_id=recipient.id,
-                transaction_type='receive',
-                from_currency=form.currency.data,
-                to_currency=form.currency.data,
-                amount=form.amount.data,
-                fee=0.0,
-                status='completed',
-                completed_at=datetime.utcnow()
-            )
+            flash(f'Successfully sent {form.amount.data} {form.currency.data} to {form.recipient_email.data}', 'success')
+            return redirect(url_for('main.wallet'))
 
-            db.session.add(send_transaction)
-            db.session.add(receive_transaction)
-            db.session.commit()
+        except ledger.InsufficientFunds:
+            total_deduction = form.amount.data + fee
+            flash(f'Insufficient balance. Need {total_deduction:.2f} including fees.', 'danger')
+            return render_template('payment.html', form=form)
 
-            flash(f'Successfully sent {form.amount.data} {form.currency.data} to {form.recipient_email.data}', 'success')
-            return redirect(url_for('wallet'))
+        except ledger.IdempotencyConflict:
+            flash('This form was already submitted with different details. Please review and submit again.', 'warning')
+            form.idempotency_key.data = None
 
         except Exception as e:
             db.session.rollback()
             logging.error(f"Payment error: {e}")
             flash('Payment failed. Please try again.', 'danger')
 
-    recent_transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .filter(Transaction.transaction_type.in_(['send', 'receive']))\
-        .order_by(Transaction.created_at.desc()).limit(10).all()
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = uuid.uuid4().hex
 
-    return render_template('payments.html', form=form, transactions=recent_transactions)
+    recent_transactions = transaction_history.user_transactions(
+        current_user.id, types=['send', 'receive']
+    ).limit(10).all()
+
+    return render_template('payment.html', form=form, transactions=recent_transactions)
 
 
 # ----------------------
 # KYC & Profile
 # ----------------------
-@app.route('/kyc', methods=['GET', 'POST'])
+@bp.route('/kyc', methods=['GET', 'POST'])
 @login_required
+@read_only
 def kyc():
     form = KYCForm()
 
@@ -320,7 +337,7 @@ def kyc():
         try:
             if KYCDocument.query.filter_by(user_id=current_user.id, status='approved').first():
                 flash('Your KYC is already approved.', 'info')
-                return redirect(url_for('profile'))
+                return redirect(url_for('main.profile'))
 
             kyc_doc = KYCDocument(
                 user_id=current_user.id,
@@ -331,9 +348,10 @@ def kyc():
 
             db.session.add(kyc_doc)
             db.session.commit()
+            user_cache.invalidate(current_user.id)
 
             flash('KYC submitted. Verification may take 24-48 hours.', 'success')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
 
         except Exception as e:
             db.session.rollback()
@@ -346,15 +364,15 @@ def kyc():
     return render_template('kyc.html', form=form, documents=kyc_documents)
 
 
-@app.route('/profile')
+@bp.route('/profile')
 @login_required
+@read_only
 def profile():
     latest_kyc = KYCDocument.query.filter_by(user_id=current_user.id)\
         .order_by(KYCDocument.uploaded_at.desc()).first()
     kyc_status = latest_kyc.status.title() if latest_kyc else 'Not Submitted'
 
-    transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.created_at.desc()).limit(20).all()
+    transactions = transaction_history.user_transactions(current_user.id).limit(20).all()
 
     return render_template('profile.html',
                            kyc_status=kyc_status,
@@ -364,23 +382,100 @@ def profile():
 # ----------------------
 # API Endpoints
 # ----------------------
-@app.route('/api/crypto-prices')
+@bp.route('/api/crypto-prices')
 def api_crypto_prices():
     try:
         prices = crypto_api.get_crypto_prices()
-        return jsonify(prices)
+        # Fallback prices aren't a real snapshot, so they get version 0
+        version = crypto_api.last_fetch_time if prices is crypto_api.cache else 0
+        return snapshot_response(request, prices, version, crypto_api.cache_ttl)
     except Exception as e:
         logging.error(f"API error: {e}")
         return jsonify({'error': 'Failed to fetch prices'}), 500
 
 
-@app.route('/api/historical-data/<coin_id>')
+@bp.route('/api/transactions')
+@login_required
+@read_only
+def api_transactions():
+    limit = request.args.get('limit', transaction_history.DEFAULT_PAGE_SIZE, type=int)
+    types = [t for t in request.args.get('type', '').split(',') if t] or None
+    try:
+        rows, next_cursor = transaction_history.page_transactions(
+            current_user.id, limit=limit, cursor=request.args.get('cursor'), types=types
+        )
+    except transaction_history.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'transactions': [transaction_history.serialize_transaction(t) for t in rows],
+        'next_cursor': next_cursor
+    })
+
+
+@bp.route('/api/transactions/export')
+@login_required
+@read_only
+def api_transactions_export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO dates'}), 400
+
+    # A bare end date includes that whole day
+    if end and len(request.args['end']) == 10:
+        end += timedelta(days=1)
+
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    batches = transaction_history.iter_export_rows(current_user.id, start, end)
+    body = transaction_history.generate_export(batches, fmt, compress)
+
+    response = Response(stream_with_context(body),
+                        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename=transactions.{fmt}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@bp.route('/api/prices/stream')
+def api_price_stream():
+    # Server-Sent Events: a full snapshot on connect, then per-tick deltas
+    if not price_broadcaster.acquire():
+        return jsonify({'error': 'Too many price streams open; poll /api/crypto-prices instead'}), 503, \
+            {'Retry-After': '30'}
+
+    response = Response(price_broadcaster.stream(),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the client left before the first frame
+    response.call_on_close(price_broadcaster.release)
+    return response
+
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    if not metrics.authorized(request):
+        return Response(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/api/historical-data/<coin_id>')
 @login_required
+@read_only
 def api_historical_data(coin_id):
     try:
         days = request.args.get('days', 7, type=int)
         data = crypto_api.get_historical_data(coin_id, days)
         return jsonify(data)
+    except KeyError:
+        return jsonify({'error': f'Unknown coin {coin_id}'}), 404
     except Exception as e:
         logging.error(f"API historical error: {e}")
         return jsonify({'error': 'Failed to fetch historical data'}), 500
@@ -389,12 +484,12 @@ def api_historical_data(coin_id):
 # ----------------------
 # Error Handlers
 # ----------------------
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ["PRICE_REFRESHER_ENABLED"] = "false"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["COINGECKO_BASE_URL"] = "http://127.0.0.1:9"
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+PRICES = {
+    "bitcoin": {"usd": 60000.0, "inr": 4986000.0, "usd_24h_change": 1.5, "usd_market_cap": 1e12, "usd_24h_vol": 3e10},
+    "ethereum": {"usd": 3000.0, "inr": 249300.0, "usd_24h_change": -0.5, "usd_market_cap": 4e11, "usd_24h_vol": 1e10},
+    "tether": {"usd": 1.0, "inr": 83.1, "usd_24h_change": 0.0, "usd_market_cap": 1e11, "usd_24h_vol": 5e10},
+}
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import create_app, db
+    import models  # noqa: F401
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture(autouse=True)
+def live_prices(app):
+    """Serve a fixed snapshot so no test waits on CoinGecko"""
+    from crypto_api import crypto_api
+
+    crypto_api.cache = PRICES
+    crypto_api.last_fetch_time = time.time()
+    yield
+    crypto_api.cache = {}
+    crypto_api.last_fetch_time = 0
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with the given wallet currencies and transaction count"""
+    from app import db
+    from models import Transaction, User, Wallet
+
+    counter = iter(range(10 ** 6))
+
+    def make(currencies=("BTC", "ETH", "USDT", "INR", "USD"), transactions=0):
+        n = next(counter)
+        with app.app_context():
+            user = User(username=f"user{n}_{time.time_ns()}", email=f"u{n}_{time.time_ns()}@example.com",
+                        password_hash="x", first_name="Test", last_name="User")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add_all(Wallet(user_id=user.id, currency=c, balance=1) for c in currencies)
+            db.session.add_all(
+                Transaction(user_id=user.id, transaction_type="convert", from_currency="INR",
+                            to_currency="BTC", amount=1, rate=1, fee=0, status="completed")
+                for _ in range(transactions)
+            )
+            db.session.commit()
+            return user.id
+
+    return make
+
+
+@pytest.fixture
+def login(app):
+    def login(client, user_id):
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+    return login
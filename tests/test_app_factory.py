@@ -0,0 +1,10 @@
+import threading
+
+
+def test_create_app_starts_no_background_threads(monkeypatch):
+    # CLI commands, shells and migrations all go through create_app
+    from app import create_app
+
+    monkeypatch.setenv("PRICE_REFRESHER_ENABLED", "true")
+    create_app()
+    assert "price-refresher" not in [t.name for t in threading.enumerate()]
@@ -0,0 +1,29 @@
+from flask import render_template
+
+SOLANA = {"id": "solana", "symbol": "SOL", "name": "Solana"}
+QUOTE = {"usd": 150.0, "inr": 12465.0, "usd_24h_change": 2.0, "usd_market_cap": 7e10, "usd_24h_vol": 3e9}
+
+
+def render(app, template, prices):
+    with app.test_request_context():
+        return render_template(template, prices=prices)
+
+
+def test_price_fragments_label_coins_from_the_coin_config(app, monkeypatch):
+    import coins
+
+    monkeypatch.setitem(coins.COINS_BY_ID, "solana", SOLANA)
+    prices = {"solana": QUOTE}
+
+    trading = render(app, "fragments/trading_prices.html", prices)
+    assert 'data-symbol="SOL"' in trading
+    assert "Solana (SOL)" in trading
+    assert "USDT" not in trading
+    assert "Solana (SOL)" in render(app, "fragments/market_overview.html", prices)
+    assert "SOL" in render(app, "fragments/dashboard_prices.html", prices)
+
+
+def test_coins_missing_from_the_config_are_not_shown(app):
+    html = render(app, "fragments/trading_prices.html", {"dogecoin": QUOTE})
+    assert "dogecoin" not in html
+    assert "Tether" not in html
@@ -0,0 +1,73 @@
+import shutil
+import time
+
+import pytest
+
+
+@pytest.fixture
+def replicated(monkeypatch, tmp_path):
+    """An app whose replica is a copy of the primary taken before one more transaction was written"""
+    import db_routing
+    from app import create_app, db
+    from models import Transaction, User, Wallet
+
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{primary}")
+    monkeypatch.setattr(db_routing, "REPLICA_URLS", [f"sqlite:///{replica}"])
+    monkeypatch.setattr(db_routing, "REPLICA_KEYS", ["replica_0"])
+    monkeypatch.setattr(db_routing, "_lag", {})
+
+    app = create_app()
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.create_all()
+        user = User(username="replicated", email="replicated@example.com", password_hash="x",
+                    first_name="Test", last_name="User")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Wallet(user_id=user.id, currency="INR", balance=1))
+        db.session.add(Transaction(user_id=user.id, transaction_type="deposit", from_currency="INR",
+                                   to_currency="INR", amount=1, fee=0, status="completed"))
+        db.session.commit()
+
+        db.engine.dispose()  # closing the last connection checkpoints the WAL into the file
+        shutil.copy(primary, replica)  # the replica has not seen anything written after this
+
+        db.session.add(Transaction(user_id=user.id, transaction_type="deposit", from_currency="INR",
+                                   to_currency="INR", amount=2, fee=0, status="completed"))
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def transaction_count(client):
+    response = client.get("/api/transactions")
+    assert response.status_code == 200
+    return len(response.get_json()["transactions"])
+
+
+def test_reads_go_to_the_replica(replicated):
+    assert transaction_count(replicated) == 1
+
+
+def test_recent_write_sticks_reads_to_the_primary(replicated):
+    import db_routing
+
+    with replicated.session_transaction() as session:
+        session[db_routing.LAST_WRITE_KEY] = time.time()
+
+    assert transaction_count(replicated) == 2
+
+
+def test_lagging_replica_is_skipped(replicated):
+    import db_routing
+
+    # A fresh lag measurement over the limit, so it is used until the next check
+    db_routing._lag["replica_0"] = (time.time(), db_routing.REPLICA_MAX_LAG + 1)
+
+    assert transaction_count(replicated) == 2
@@ -0,0 +1,60 @@
+import pytest
+import requests
+
+from http_client import CircuitBreaker, UpstreamClient
+
+
+class Response:
+    def __init__(self, status_code=200, body=None, error=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+        self._error = error
+
+    def json(self):
+        if self._error:
+            raise self._error
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(str(self.status_code))
+
+
+def client_returning(*outcomes):
+    """An UpstreamClient whose session.get yields (or raises) each outcome in turn"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client = UpstreamClient("http://upstream", max_retries=0, breaker=breaker)
+    outcomes = iter(outcomes)
+
+    def get(url, params=None, timeout=None):
+        outcome = next(outcomes)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    client.session.get = get
+    return client, breaker
+
+
+@pytest.mark.parametrize("failure", [
+    requests.exceptions.ChunkedEncodingError("connection dropped mid-body"),
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.TooManyRedirects("redirect loop"),
+    Response(200, error=requests.exceptions.JSONDecodeError("not json", "<html>", 0)),
+    RuntimeError("unexpected"),
+])
+def test_failed_half_open_probe_lets_the_next_probe_through(failure):
+    client, breaker = client_returning(requests.exceptions.ConnectionError("down"), failure,
+                                       Response(200, {"ok": True}))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get_json("/ping")
+    assert breaker.state == "half-open"
+
+    with pytest.raises(Exception):
+        client.get_json("/ping")  # the probe fails
+    assert not breaker._probing
+
+    assert client.get_json("/ping") == {"ok": True}
+    assert breaker.state == "closed"
@@ -0,0 +1,54 @@
+import pytest
+
+
+def trade(app, user_id, amount, key):
+    import ledger
+
+    with app.app_context():
+        transaction = ledger.execute_trade(user_id, "buy", "INR", "BTC", amount, amount / 100, 0,
+                                           idempotency_key=key)
+        return transaction.id, transaction.user_id
+
+
+def test_resubmitted_key_replays_the_stored_transaction(app, make_user):
+    user = make_user()
+
+    first = trade(app, user, 0.5, "resubmit")
+    assert trade(app, user, 0.5, "resubmit") == first
+
+
+def test_keys_are_scoped_to_the_user(app, make_user):
+    alice, bob = make_user(), make_user()
+
+    alice_transaction = trade(app, alice, 0.5, "k1")
+    bob_transaction = trade(app, bob, 0.5, "k1")
+
+    assert bob_transaction[1] == bob
+    assert bob_transaction[0] != alice_transaction[0]
+
+
+def test_reused_key_with_different_details_is_rejected(app, make_user):
+    import ledger
+    from models import Wallet
+    from money import to_decimal
+
+    user = make_user()
+    trade(app, user, 0.5, "changed")
+
+    with pytest.raises(ledger.IdempotencyConflict):
+        trade(app, user, 0.25, "changed")
+    with app.app_context():
+        assert Wallet.query.filter_by(user_id=user, currency="INR").one().balance == to_decimal("0.5")
+
+
+def test_rate_keeps_every_digit_of_a_small_conversion(app, make_user):
+    from decimal import Decimal
+
+    import ledger
+    from app import db
+    from models import Transaction
+
+    user = make_user()
+    with app.app_context():
+        transaction_id = ledger.execute_trade(user, "buy", "INR", "BTC", "0.997", "0.0000002", 0).id
+        assert db.session.get(Transaction, transaction_id).rate == Decimal("0.000000200601805416")
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+
+def test_slow_hash_raises_busy_instead_of_futures_timeout(monkeypatch):
+    import passwords
+
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_TIMEOUT", 0.05)
+    with pytest.raises(passwords.PasswordHashBusy):
+        passwords._run(time.sleep, 1)
+
+
+def test_login_returns_503_when_hashing_is_backed_up(app, make_user, monkeypatch):
+    from app import db
+    from models import User
+    from passwords import PasswordHashBusy
+
+    user_id = make_user()
+    with app.app_context():
+        username = db.session.get(User, user_id).username
+
+    def busy(self, password):
+        raise PasswordHashBusy("backlog")
+
+    monkeypatch.setattr(User, "check_password", busy)
+    response = app.test_client().post("/login", data={"username": username, "password": "secret"})
+    assert response.status_code == 503
+    assert b"try again" in response.data
+
+
+@pytest.mark.parametrize("method", ["scrypt", "scrypt:16384:8:1", "pbkdf2", "pbkdf2:sha512", "pbkdf2:sha256:1"])
+def test_needs_rehash_matches_werkzeug_without_hashing(monkeypatch, method):
+    from werkzeug.security import generate_password_hash
+
+    import passwords
+
+    stored = generate_password_hash("secret", method)
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_METHOD", method)
+    monkeypatch.setattr(passwords, "generate_password_hash", None)  # any hashing would fail
+
+    assert not passwords.needs_rehash(stored)
+    assert passwords.needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:2"))
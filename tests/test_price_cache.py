@@ -0,0 +1,30 @@
+import pytest
+
+from price_cache import MemoryPriceCache, PriceCache
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoDelete(PriceCache):
+        def get(self, key):
+            return None
+
+        def set(self, key, value, ttl):
+            pass
+
+        def add(self, key, value, ttl):
+            return True
+
+    with pytest.raises(TypeError):
+        NoDelete()
+
+
+def test_memory_cache_fetches_once_per_miss():
+    cache = MemoryPriceCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"bitcoin": {"usd": 1.0}}
+
+    assert cache.get_or_fetch("prices", fetch, ttl=60) == cache.get_or_fetch("prices", fetch, ttl=60)
+    assert len(calls) == 1
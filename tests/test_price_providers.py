@@ -0,0 +1,54 @@
+import pytest
+
+from price_providers import PriceAggregator, PriceProvider, StaticProvider
+
+BTC = {"usd": 60000.0, "inr": 4986000.0, "usd_24h_vol": 1.0}
+
+
+def quotes(usd, volume):
+    return {"bitcoin": dict(BTC, usd=usd, usd_24h_vol=volume)}
+
+
+class FailingProvider(PriceProvider):
+    def fetch(self, coin_ids):
+        raise ConnectionError("upstream reset")
+
+
+def test_provider_without_fetch_fails_at_construction():
+    class NoFetch(PriceProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        NoFetch("incomplete")
+
+
+@pytest.mark.parametrize("method, expected", [("median", 60000.0), ("vwap", 60400.0)])
+def test_quotes_are_merged_by_median_or_volume_weight(method, expected):
+    aggregator = PriceAggregator([
+        StaticProvider("a", quotes(59000.0, 1.0)),
+        StaticProvider("b", quotes(60000.0, 1.0)),
+        StaticProvider("c", quotes(61000.0, 3.0)),
+    ], method=method)
+
+    assert aggregator.fetch(["bitcoin"])["bitcoin"]["usd"] == pytest.approx(expected)
+
+
+def test_provider_over_budget_is_dropped():
+    aggregator = PriceAggregator([
+        StaticProvider("fast", quotes(60000.0, 1.0)),
+        StaticProvider("slow", quotes(1.0, 1.0), delay=0.2, budget=0.05),
+    ])
+
+    assert aggregator.fetch(["bitcoin"])["bitcoin"]["usd"] == 60000.0
+    assert aggregator.stats()["slow"] == {"ok": 0, "errors": 0, "dropped": 1}
+
+
+def test_failing_provider_is_counted_and_skipped():
+    aggregator = PriceAggregator([StaticProvider("ok", quotes(60000.0, 1.0)), FailingProvider("broken")])
+
+    for _ in range(2):
+        assert aggregator.fetch(["bitcoin"])["bitcoin"]["usd"] == 60000.0
+    assert aggregator.stats() == {
+        "ok": {"ok": 2, "errors": 0, "dropped": 0},
+        "broken": {"ok": 0, "errors": 2, "dropped": 0},
+    }
@@ -0,0 +1,50 @@
+import pytest
+
+
+def get(client, **headers):
+    return client.get("/api/crypto-prices", headers=headers)
+
+
+def test_each_encoding_has_its_own_etag(app):
+    client = app.test_client()
+    identity = get(client).headers["ETag"]
+    gzipped = get(client, **{"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    assert identity != gzipped
+    assert gzipped == identity[:-1] + '-gzip"'
+
+
+def test_etag_of_another_encoding_is_not_a_match(app):
+    client = app.test_client()
+    gzipped = get(client, **{"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    assert get(client, **{"If-None-Match": gzipped}).status_code == 200
+
+
+@pytest.mark.parametrize("if_none_match", [
+    "{etag}",
+    'W/{etag}',
+    '"other", {etag}',
+    "*",
+])
+def test_if_none_match_is_parsed_as_entity_tags(app, if_none_match):
+    client = app.test_client()
+    etag = get(client).headers["ETag"]
+
+    response = get(client, **{"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+
+def test_prices_do_not_vary_on_cookie(app, make_user, login):
+    anonymous = app.test_client()
+    signed_in = app.test_client()
+    login(signed_in, make_user())
+
+    for client in (anonymous, signed_in):
+        response = get(client, **{"Accept-Encoding": "gzip"})
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert "Set-Cookie" not in response.headers
+
+    assert "Cookie" in signed_in.get("/dashboard").headers["Vary"]
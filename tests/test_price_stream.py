@@ -0,0 +1,41 @@
+def test_stream_beyond_the_cap_gets_503_and_closed_streams_free_their_slot(app, monkeypatch):
+    from price_stream import price_broadcaster
+
+    monkeypatch.setattr(price_broadcaster, "max_clients", 1)
+    monkeypatch.setattr(price_broadcaster, "keepalive", 0.01)
+    client = app.test_client()
+
+    first = client.get("/api/prices/stream", buffered=False)
+    assert first.status_code == 200
+    second = client.get("/api/prices/stream", buffered=False)
+    assert second.status_code == 503
+    assert second.headers["Retry-After"]
+
+    first.close()
+    assert price_broadcaster.clients == 0
+    third = client.get("/api/prices/stream", buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_database_snapshot_reaches_stream_listeners(app):
+    from datetime import datetime
+
+    from app import db
+    from crypto_api import CryptoAPI, crypto_api
+    from models import CryptoPrice
+
+    heard = []
+    CryptoAPI.snapshot_listeners.append(lambda snapshot, version: heard.append(version))
+    try:
+        with app.app_context():
+            db.session.merge(CryptoPrice(symbol="BTC", current_price_usd=1, current_price_inr=83,
+                                         price_change_24h=0, market_cap=1, volume_24h=1,
+                                         last_updated=datetime.utcnow()))
+            db.session.commit()
+            crypto_api.cache, crypto_api.last_fetch_time = {}, 0
+            crypto_api.load_snapshot_from_database()
+    finally:
+        CryptoAPI.snapshot_listeners.pop()
+
+    assert heard == [crypto_api.last_fetch_time]
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import event
+
+
+def count_queries(app, client, path):
+    from app import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+# Dashboard: recent transactions + wallets. Wallet page: wallets. current_user comes from user_cache.
+@pytest.mark.parametrize("path, expected", [("/dashboard", 2), ("/wallet", 1)])
+def test_page_query_count_is_independent_of_wallets_and_history(app, make_user, login, path, expected):
+    small = make_user(currencies=("INR",), transactions=0)
+    large = make_user(currencies=[f"C{i}" for i in range(40)] + ["BTC", "ETH", "USDT", "INR", "USD"],
+                      transactions=25)
+
+    counts = []
+    for user_id in (small, large):
+        client = app.test_client()
+        login(client, user_id)
+        client.get(path)  # warm the per-process user cache, as on every request after login
+        counts.append(count_queries(app, client, path))
+
+    assert counts[0] == counts[1], f"{path} issued {counts} statements for a small vs large account"
+    assert counts[1] == expected
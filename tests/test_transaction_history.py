@@ -0,0 +1,20 @@
+import json
+
+
+def test_small_amounts_are_exported_without_exponents(app, make_user, login):
+    import ledger
+
+    user = make_user()
+    with app.app_context():
+        ledger.execute_trade(user, "buy", "INR", "BTC", "0.997", "0.0000002", 0)
+        ledger.execute_trade(user, "buy", "INR", "BTC", "0.0000001", "0", 0)
+
+    client = app.test_client()
+    login(client, user)
+    page = client.get("/api/transactions").get_json()["transactions"]
+    export = [json.loads(line) for line in client.get("/api/transactions/export?format=jsonl").data.splitlines()]
+
+    for rows in (page, export):
+        values = [row[field] for row in rows for field in ("amount", "rate", "fee")]
+        assert not [v for v in values if "E" in v], values
+        assert {"0.00000010", "0.00000000", "0.000000200601805416"} <= set(values)
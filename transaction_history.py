@@ -0,0 +1,144 @@
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from app import db
+from models import Transaction
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rows fetched per server-side cursor round-trip, and rows per streamed chunk
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FIELDS = [
+    "id", "type", "from_currency", "to_currency", "amount", "rate", "fee",
+    "status", "recipient_address", "created_at", "completed_at"
+]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(transaction):
+    raw = f"{transaction.created_at.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(transaction_id)
+    except Exception:
+        raise InvalidCursor("Malformed pagination cursor")
+
+
+def user_transactions(user_id, types=None):
+    """Newest-first transactions for a user, served by the (user_id, [type,] created_at) indexes"""
+    query = Transaction.query.filter(Transaction.user_id == user_id)
+    if types:
+        query = query.filter(Transaction.transaction_type.in_(types))
+    return query.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+
+
+def page_transactions(user_id, limit=DEFAULT_PAGE_SIZE, cursor=None, types=None):
+    """Keyset-paginated page of transactions; returns (rows, next_cursor)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = user_transactions(user_id, types)
+
+    if cursor:
+        created_at, transaction_id = decode_cursor(cursor)
+        # The plain <= bound lets the index seek straight to the cursor; the OR alone
+        # is only a filter, so the scan would start at the newest row of every page
+        query = query.filter(Transaction.created_at <= created_at, or_(
+            Transaction.created_at < created_at,
+            and_(Transaction.created_at == created_at, Transaction.id < transaction_id)
+        ))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _plain(value):
+    """Decimal as positional text; str() would give "1E-7" or "0E-8" for small values"""
+    return f"{value:f}" if value is not None else None
+
+
+def serialize_transaction(transaction):
+    return {
+        "id": transaction.id,
+        "type": transaction.transaction_type,
+        "from_currency": transaction.from_currency,
+        "to_currency": transaction.to_currency,
+        "amount": _plain(transaction.amount),
+        "rate": _plain(transaction.rate),
+        "fee": _plain(transaction.fee),
+        "status": transaction.status,
+        "recipient_address": transaction.recipient_address,
+        "created_at": transaction.created_at.isoformat() if transaction.created_at else None,
+        "completed_at": transaction.completed_at.isoformat() if transaction.completed_at else None
+    }
+
+
+def iter_export_rows(user_id, start=None, end=None):
+    """Stream a user's transactions oldest-first through a server-side cursor"""
+    query = select(
+        Transaction.id, Transaction.transaction_type, Transaction.from_currency,
+        Transaction.to_currency, Transaction.amount, Transaction.rate, Transaction.fee,
+        Transaction.status, Transaction.recipient_address, Transaction.created_at,
+        Transaction.completed_at
+    ).where(Transaction.user_id == user_id)
+
+    if start:
+        query = query.where(Transaction.created_at >= start)
+    if end:
+        query = query.where(Transaction.created_at < end)
+
+    query = query.order_by(Transaction.created_at, Transaction.id)\
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+
+    for partition in db.session.execute(query).partitions():
+        yield [serialize_transaction(row) for row in partition]
+
+
+def generate_export(batches, fmt="csv", compress=False):
+    """Encode batches of serialized transactions as CSV or JSON Lines chunks"""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+
+    def emit(text):
+        data = text.encode()
+        if not compressor:
+            return data
+        # Sync-flush so each batch reaches the client instead of sitting in zlib
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+
+    for batch in batches:
+        if writer:
+            writer.writerows(batch)
+        else:
+            buffer.writelines(json.dumps(row) + "\n" for row in batch)
+
+        chunk = emit(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        if chunk:
+            yield chunk
+
+    tail = emit(buffer.getvalue())
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
@@ -0,0 +1,70 @@
+import os
+import threading
+
+from cachetools import TTLCache
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from app import db
+from models import User, Wallet
+
+# Short TTL bounds staleness across workers; same-process changes invalidate immediately
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+
+_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+class SessionUser(UserMixin):
+    """Slim read-only projection of a User row, used as current_user"""
+
+    FIELDS = (
+        "id", "username", "email", "first_name", "last_name", "phone",
+        "is_kyc_verified", "two_factor_enabled", "created_at"
+    )
+
+    def __init__(self, user):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(user, field))
+
+    @property
+    def wallets(self):
+        return Wallet.query.filter_by(user_id=self.id).all()
+
+
+def load_user(user_id):
+    """Return the cached projection for user_id, loading it on a miss"""
+    user_id = int(user_id)
+    with _lock:
+        cached = _cache.get(user_id)
+        _stats["hits" if cached is not None else "misses"] += 1
+    if cached is not None:
+        return cached
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+
+    projection = SessionUser(user)
+    with _lock:
+        _cache[user_id] = projection
+    return projection
+
+
+def invalidate(user_id):
+    with _lock:
+        if _cache.pop(int(user_id), None) is not None:
+            _stats["invalidations"] += 1
+
+
+def stats():
+    with _lock:
+        return dict(_stats, size=len(_cache))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate(target.id)